@@ -5,26 +5,59 @@
 # https://stackoverflow.com/questions/47704008/fastest-way-to-get-all-the-points-between-two-x-y-coordinates-in-python
 # https://stackoverflow.com/a/35756376/15096247
 
-import copy
+import array
+import functools
+import heapq
 import itertools
 import os
+import re
 import sys
+import threading
 import warnings
-from collections import namedtuple
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from ctypes import wintypes, Structure, POINTER, Union, byref, sizeof
-from ctypes.wintypes import DWORD, WORD, HWND, UINT, WPARAM, LPARAM, LPVOID, BOOL
-from math import floor
-from random import uniform
-import numpy as np
-import kthread
+from ctypes.wintypes import DWORD, HWND, UINT, WPARAM, LPVOID, BOOL
+from math import isqrt
 import string
 import time
 import ctypes
-import six
-import keyboard as key_b
-from ctypes_rgb_values import get_rgb_values
-from ctypes_window_info import get_window_infos
-from flatten_everything import flatten_everything, ProtectedTuple
+import importlib
+
+# numpy, kthread, keyboard, ctypes_rgb_values and ctypes_window_info are imported
+# inside the functions that need them, so importing this module stays cheap.
+# The names they used to be bound to at module level are still resolved on
+# first access through __getattr__ (PEP 562).
+_LAZY_IMPORTS = {
+    "np": ("numpy", None),
+    "kthread": ("kthread", None),
+    "key_b": ("keyboard", None),
+    "get_rgb_values": ("ctypes_rgb_values", "get_rgb_values"),
+    "get_window_infos": ("ctypes_window_info", "get_window_infos"),
+}
+
+
+def __getattr__(name):
+    """Import a lazily loaded dependency on first attribute access.
+
+    Args:
+        name: The attribute name looked up on the module.
+
+    Returns:
+        The imported module or function.
+
+    Raises:
+        AttributeError: If name is not a lazily loaded dependency.
+    """
+    try:
+        module_name, attr = _LAZY_IMPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = importlib.import_module(module_name)
+    if attr is not None:
+        value = getattr(value, attr)
+    globals()[name] = value
+    return value
 
 # Declares at a lower level a function BlockInput(fBlockIt: bool) -> bool
 # Example:
@@ -42,6 +75,118 @@ BlockInput = ctypes.windll.user32.BlockInput
 BlockInput.argtypes = [wintypes.BOOL]
 BlockInput.restype = wintypes.BOOL
 
+
+class RECT(ctypes.Structure):
+    """Represents a Win32 RECT structure defining a rectangle by its edges."""
+    _fields_ = [
+        ("left", ctypes.c_long),
+        ("top", ctypes.c_long),
+        ("right", ctypes.c_long),
+        ("bottom", ctypes.c_long),
+    ]
+
+
+# Private user32/kernel32 handles used by the window inspection functions.
+# The prototypes are bound once here, so enumerating a window tree only pays
+# for the calls themselves and not for resolving and configuring them again.
+_user32 = ctypes.WinDLL("user32")
+_kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+
+_WNDENUMPROC = ctypes.WINFUNCTYPE(BOOL, HWND, ctypes.py_object)
+
+_GetWindowRect = _user32.GetWindowRect
+_GetWindowRect.argtypes = [HWND, POINTER(RECT)]
+_GetWindowRect.restype = BOOL
+
+_GetClientRect = _user32.GetClientRect
+_GetClientRect.argtypes = [HWND, POINTER(RECT)]
+_GetClientRect.restype = BOOL
+
+_GetWindowTextLengthW = _user32.GetWindowTextLengthW
+_GetWindowTextLengthW.argtypes = [HWND]
+_GetWindowTextLengthW.restype = ctypes.c_int
+
+_GetWindowTextW = _user32.GetWindowTextW
+_GetWindowTextW.argtypes = [HWND, wintypes.LPWSTR, ctypes.c_int]
+_GetWindowTextW.restype = ctypes.c_int
+
+_GetClassNameW = _user32.GetClassNameW
+_GetClassNameW.argtypes = [HWND, wintypes.LPWSTR, ctypes.c_int]
+_GetClassNameW.restype = ctypes.c_int
+
+_GetWindowThreadProcessId = _user32.GetWindowThreadProcessId
+_GetWindowThreadProcessId.argtypes = [HWND, POINTER(DWORD)]
+_GetWindowThreadProcessId.restype = DWORD
+
+_IsWindowVisible = _user32.IsWindowVisible
+_IsWindowVisible.argtypes = [HWND]
+_IsWindowVisible.restype = BOOL
+
+_WindowFromPoint = _user32.WindowFromPoint
+_WindowFromPoint.argtypes = [wintypes.POINT]
+_WindowFromPoint.restype = HWND
+
+_GetParent = _user32.GetParent
+_GetParent.argtypes = [HWND]
+_GetParent.restype = HWND
+
+_GetAncestor = _user32.GetAncestor
+_GetAncestor.argtypes = [HWND, UINT]
+_GetAncestor.restype = HWND
+
+_SetWindowPos = _user32.SetWindowPos
+_SetWindowPos.argtypes = [
+    HWND,
+    HWND,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+    UINT,
+]
+_SetWindowPos.restype = BOOL
+
+_BringWindowToTop = _user32.BringWindowToTop
+_BringWindowToTop.argtypes = [HWND]
+_BringWindowToTop.restype = BOOL
+
+_GetDesktopWindow = _user32.GetDesktopWindow
+_GetDesktopWindow.argtypes = []
+_GetDesktopWindow.restype = HWND
+
+_EnumChildWindows = _user32.EnumChildWindows
+_EnumChildWindows.argtypes = [HWND, _WNDENUMPROC, ctypes.py_object]
+_EnumChildWindows.restype = BOOL
+
+_GetKeyboardLayout = _user32.GetKeyboardLayout
+_GetKeyboardLayout.argtypes = [DWORD]
+_GetKeyboardLayout.restype = wintypes.HKL
+
+_MapVirtualKeyExW = _user32.MapVirtualKeyExW
+_MapVirtualKeyExW.argtypes = [UINT, UINT, wintypes.HKL]
+_MapVirtualKeyExW.restype = UINT
+
+_EnumWindows = _user32.EnumWindows
+_EnumWindows.argtypes = [_WNDENUMPROC, ctypes.py_object]
+_EnumWindows.restype = BOOL
+
+_OpenProcess = _kernel32.OpenProcess
+_OpenProcess.argtypes = [DWORD, BOOL, DWORD]
+_OpenProcess.restype = wintypes.HANDLE
+
+_QueryFullProcessImageNameW = _kernel32.QueryFullProcessImageNameW
+_QueryFullProcessImageNameW.argtypes = [
+    wintypes.HANDLE,
+    DWORD,
+    wintypes.LPWSTR,
+    POINTER(DWORD),
+]
+_QueryFullProcessImageNameW.restype = BOOL
+
+_CloseHandle = _kernel32.CloseHandle
+_CloseHandle.argtypes = [wintypes.HANDLE]
+_CloseHandle.restype = BOOL
+
 # Declares at a lower level a module-level shared state accessor using sys.modules[__name__]
 # This pattern allows the module to store and mutate its own attributes at runtime,
 # making state (like `rightnow`) accessible and modifiable from anywhere that imports the module.
@@ -95,11 +240,71 @@ def get_elements_from_xy(x, y):
     return _get_elements_from_coords(coordx=x, coordy=y, hwnd=None)
 
 
+WindowInfo = namedtuple(
+    "WindowInfo",
+    "parent pid title windowtext hwnd length tid status coords_client dim_client coords_win dim_win class_name path",
+)
+
+# get_active_window returns the WindowInfo of ctypes_window_info, which has no parent field
+_TopWindowInfo = namedtuple("WindowInfo", WindowInfo._fields[1:])
+
+# Values of WindowInfo.status
+_STATUS_VISIBLE = sys.intern("visible")
+_STATUS_INVISIBLE = sys.intern("invisible")
+
+# Per-thread scratch buffer for window texts, only longer texts get their own buffer
+_TEXT_BUFFER_SIZE = 512
+_text_buffer = threading.local()
+
+# Per-thread scratch buffer for class names, which are at most 256 characters long
+_CLASS_NAME_BUFFER_SIZE = 257
+_class_name_buffer = threading.local()
+
+
+@_WNDENUMPROC
+def _append_hwnd(hwnd, obj):
+    """EnumWindows/EnumChildWindows callback that appends each hwnd to the list passed as lParam."""
+    obj.append(hwnd)
+    return True
+
+
+def snapshot_windows():
+    """Enumerate every top-level window and all of its descendants in one pass.
+
+    Only the window hierarchy is collected (two cheap calls per window), so the
+    snapshot can be used to resolve a window family without querying the details
+    of windows that turn out to be unrelated.
+
+    Returns:
+        dict: Maps each hwnd to a (parent, owner) tuple, where parent is the
+              GetAncestor(GA_PARENT) handle and owner the GetParent handle.
+              Either may be None.
+    """
+    toplevel = []
+    _EnumWindows(_append_hwnd, toplevel)
+    hwnds = list(toplevel)
+    for top in toplevel:
+        _EnumChildWindows(top, _append_hwnd, hwnds)
+    return {h: (_GetAncestor(h, 1), _GetParent(h)) for h in hwnds}
+
+
+@functools.lru_cache(maxsize=None)
+def _get_window_info_executor():
+    """Get the thread pool shared by all window family lookups.
+
+    Returns:
+        ThreadPoolExecutor: The executor, created on the first call. Its threads are
+        started on demand and reused by later lookups.
+    """
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="window_info")
+
+
 def _get_elements_from_coords(coordx=None, coordy=None, hwnd=None):
     """Internal function to retrieve window elements from screen coordinates or a window handle.
 
-    Recursively discovers all related windows (parents, ancestors, children, siblings)
-    starting from the window found at the given coordinates or the specified handle.
+    Discovers all related windows (parents, ancestors, owners, children, siblings)
+    starting from the window found at the given coordinates or the specified handle,
+    using a single snapshot of the window hierarchy from snapshot_windows().
 
     Args:
         coordx: The x screen coordinate (None if using hwnd).
@@ -109,46 +314,169 @@ def _get_elements_from_coords(coordx=None, coordy=None, hwnd=None):
     Returns:
         dict: A dictionary with 'element' (the target WindowInfo) and 'family' (list of all related WindowInfo).
     """
-    WindowInfoxx = namedtuple(
-        "WindowInfo",
-        "parent pid title windowtext hwnd length tid status coords_client dim_client coords_win dim_win class_name path",
-    )
-    oldlen = 0
-    newlen = 1
-    wholeli = []
     if hwnd is None:
-        firstitem = get_all_infos_point(coordx, coordy)
+        seed = _WindowFromPoint(wintypes.POINT(int(coordx), int(coordy)))
     else:
-        firstitem = get_all_infos_point(hwnd_=hwnd)
-
-    firstitem_ = list(set(flatten_everything(firstitem)))
-    allh = [
-        v
-        for v in [
-            r[4] if len(r) > 4 else None
-            for r in firstitem_
-            if isinstance(r, ProtectedTuple)
-        ]
-        if v is not None
-    ]
+        seed = hwnd
+
+    relations = snapshot_windows()
+    children = {}
+    for h, (parent, owner) in relations.items():
+        children.setdefault(parent, []).append(h)
+    desktop = _GetDesktopWindow()
+
+    # Breadth-first walk over the snapshot: from every window follow its parent,
+    # its owner and its children. The desktop belongs to the family but is not
+    # expanded, otherwise every window on the system would be related.
+    family = [seed]
+    seen = {seed}
+    queue = deque([seed])
+    while queue:
+        h = queue.popleft()
+        if h == desktop:
+            continue
+        links = relations.get(h)
+        if links is None:
+            links = (_GetAncestor(h, 1), _GetParent(h))
+        for n in itertools.chain(links, children.get(h, ())):
+            if n is not None and n not in seen:
+                seen.add(n)
+                family.append(n)
+                queue.append(n)
+
+    # The Win32 queries of _window_info release the GIL, so the members are
+    # looked up concurrently. map() keeps the order of the walk.
+    paths = {}
+    df = list(
+        _get_window_info_executor().map(
+            functools.partial(_window_info, paths=paths), family
+        )
+    )
+    rv = df[0]
 
-    while oldlen != newlen:
-        oldlen = newlen
-        didi = [get_all_infos_point(hwnd_=s) for s in allh]
-        newlente = [
-            h for h in (set(flatten_everything(didi))) if isinstance(h, ProtectedTuple)
-        ]
-        allh = [c[4] for c in newlente if len(c) > 4]
-        wholeli.append(newlente)
-        wholeli = list(set(flatten_everything(wholeli)))
-        newlen = len(wholeli)
-    df = [WindowInfoxx(*q) for q in (set(flatten_everything(wholeli)))]
-    if hwnd is None:
-        rv = WindowInfoxx(*firstitem[(coordx, coordy)]["foundelement"])
+    return {"element": rv, "family": df}
+
+
+def _get_process_path(pid, paths=None):
+    """Get the executable path of a process.
+
+    All windows of a process share the same path, so results can be kept in a dict
+    for the duration of one lookup. The dict must not outlive it, Windows reuses
+    process IDs. Failed lookups are not stored.
+
+    Args:
+        pid: The process ID.
+        paths: Optional dict mapping pid -> path for the current lookup. Defaults to None.
+
+    Returns:
+        str: The full image path, or "" if it could not be queried.
+    """
+    if paths is not None and pid in paths:
+        return paths[pid]
+    try:
+        coa = _OpenProcess(0x1000, 0, pid)
+        path = (ctypes.c_wchar * 260)()
+        size = wintypes.DWORD(260)
+        _QueryFullProcessImageNameW(coa, 0, path, byref(size))
+        filepath = path.value
+        _CloseHandle(coa)
+    except Exception:
+        filepath = ""
+    if filepath and paths is not None:
+        paths[pid] = filepath
+    return filepath
+
+
+def _get_window_text(hwnd, length=None):
+    """Get the text content of a window by its handle.
+
+    Args:
+        hwnd: The window handle.
+        length: The text length if already known. Defaults to None.
+
+    Returns:
+        str: The window's text content.
+    """
+    if length is None:
+        length = _GetWindowTextLengthW(hwnd)
+    if length == 0:
+        return ""
+    if length < _TEXT_BUFFER_SIZE:
+        buf = getattr(_text_buffer, "buf", None)
+        if buf is None:
+            buf = _text_buffer.buf = ctypes.create_unicode_buffer(_TEXT_BUFFER_SIZE)
+        buf[0] = "\0"
     else:
-        rv = WindowInfoxx(*firstitem[(0, 0)]["foundelement"])
+        buf = ctypes.create_unicode_buffer(length + 1)
+    _GetWindowTextW(hwnd, buf, length + 1)
+    return buf.value
 
-    return {"element": rv, "family": df}
+
+def _window_info(hwnd, cache=None, paths=None):
+    """Retrieve detailed information about a window and build a WindowInfo namedtuple.
+
+    Args:
+        hwnd: The window handle to inspect.
+        cache: Optional dict mapping hwnd -> result of earlier calls. Defaults to None.
+        paths: Optional dict mapping pid -> executable path, see _get_process_path. Defaults to None.
+
+    Returns:
+        WindowInfo: A namedtuple with the window details (pid, title, coords, etc.).
+    """
+    if cache is not None and hwnd in cache:
+        return cache[hwnd]
+
+    rect = RECT()
+    pid = wintypes.DWORD()
+    status = _STATUS_VISIBLE if _IsWindowVisible(hwnd) else _STATUS_INVISIBLE
+    tid = _GetWindowThreadProcessId(hwnd, byref(pid))
+    length = _GetWindowTextLengthW(hwnd) + 1
+    _GetClientRect(hwnd, byref(rect))
+    left, right, top, bottom = rect.left, rect.right, rect.top, rect.bottom
+    w, h = right - left, bottom - top
+    coords_client = left, right, top, bottom
+    dim_client = w, h
+    _GetWindowRect(hwnd, byref(rect))
+    left, right, top, bottom = rect.left, rect.right, rect.top, rect.bottom
+    w, h = right - left, bottom - top
+    coords_win = left, right, top, bottom
+    dim_win = w, h
+    title = getattr(_class_name_buffer, "buf", None)
+    if title is None:
+        title = _class_name_buffer.buf = ctypes.create_unicode_buffer(
+            _CLASS_NAME_BUFFER_SIZE
+        )
+    title[0] = "\0"
+    _GetClassNameW(hwnd, title, _CLASS_NAME_BUFFER_SIZE)
+    classname = title.value
+    try:
+        windowtext = _get_window_text(hwnd, length - 1)
+    except Exception:
+        windowtext = ""
+    filepath = _get_process_path(pid.value, paths)
+    if childcounter.rightnow is None:
+        assc = -1
+    else:
+        assc = childcounter.rightnow
+    info = WindowInfo(
+        assc,
+        pid.value,
+        classname,
+        windowtext,
+        hwnd,
+        length,
+        tid,
+        status,
+        coords_client,
+        dim_client,
+        coords_win,
+        dim_win,
+        classname,
+        filepath,
+    )
+    if cache is not None:
+        cache[hwnd] = info
+    return info
 
 
 def get_all_infos_point(coordx=None, coordy=None, hwnd_=None):
@@ -167,6 +495,9 @@ def get_all_infos_point(coordx=None, coordy=None, hwnd_=None):
               'ancestor', 'parent', 'all_children', and 'whole_family'.
     """
     TRUE = 1
+    # every window is only queried once per call
+    cache = {}
+    paths = {}
 
     class __WindowEnumerator(object):
         """
@@ -182,150 +513,15 @@ def get_all_infos_point(coordx=None, coordy=None, hwnd_=None):
             return TRUE
 
     def find_elements(hwnd):
-        """Retrieve detailed information about a window and build a WindowInfo namedtuple.
+        """Retrieve the WindowInfo of hwnd, using the cache of this call.
 
         Args:
             hwnd: The window handle to inspect.
 
         Returns:
-            list: A list of WindowInfo namedtuples with window details (pid, title, coords, etc.).
+            WindowInfo: A namedtuple with the window details.
         """
-
-        user32 = ctypes.WinDLL("user32")
-        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
-
-        GetWindowRect = ctypes.windll.user32.GetWindowRect
-        GetClientRect = ctypes.windll.user32.GetClientRect
-        WindowInfoxx = namedtuple(
-            "WindowInfo",
-            "parent pid title windowtext hwnd length tid status coords_client dim_client coords_win dim_win class_name path",
-        )
-
-        def get_window_text(hWnd):
-            """Get the text content of a window by its handle.
-
-            Args:
-                hWnd: The window handle.
-
-            Returns:
-                str: The window's text content.
-            """
-            length = ctypes.windll.user32.GetWindowTextLengthW(hWnd)
-            buf = ctypes.create_unicode_buffer(length + 1)
-            ctypes.windll.user32.GetWindowTextW(hWnd, buf, length + 1)
-            return buf.value
-
-        class RECT(ctypes.Structure):
-            """Represents a Win32 RECT structure defining a rectangle by its edges."""
-            _fields_ = [
-                ("left", ctypes.c_long),
-                ("top", ctypes.c_long),
-                ("right", ctypes.c_long),
-                ("bottom", ctypes.c_long),
-            ]
-
-        WNDENUMPROCA = ctypes.WINFUNCTYPE(
-            BOOL,
-            HWND,
-            LPARAM,
-        )
-        result = []
-
-        @WNDENUMPROCA
-        def enum_proc2(hWnd, lParam):
-            """Callback function for window enumeration that collects detailed window info.
-
-            Gathers process ID, title, visibility status, client/window coordinates,
-            class name, and executable path for each enumerated window.
-
-            Args:
-                hWnd: Handle to the current window being enumerated.
-                lParam: Application-defined value (unused).
-
-            Returns:
-                bool: True to continue enumeration.
-            """
-            status = "invisible"
-            if user32.IsWindowVisible(hWnd):
-                status = "visible"
-            pid = wintypes.DWORD()
-            tid = user32.GetWindowThreadProcessId(hWnd, ctypes.byref(pid))
-            length = user32.GetWindowTextLengthW(hWnd) + 1
-            title = ctypes.create_unicode_buffer(length)
-            user32.GetWindowTextW(hWnd, title, length)
-            rect = RECT()
-            GetClientRect(hWnd, ctypes.byref(rect))
-            left, right, top, bottom = rect.left, rect.right, rect.top, rect.bottom
-            w, h = right - left, bottom - top
-            coords_client = left, right, top, bottom
-            dim_client = w, h
-            rect = RECT()
-            GetWindowRect(hWnd, ctypes.byref(rect))
-            left, right, top, bottom = rect.left, rect.right, rect.top, rect.bottom
-            w, h = right - left, bottom - top
-            coords_win = left, right, top, bottom
-            dim_win = w, h
-            length_ = 257
-            title = ctypes.create_unicode_buffer(length_)
-            user32.GetClassNameW(hWnd, title, length_)
-            classname = title.value
-            try:
-                windowtext = get_window_text(hWnd)
-            except Exception:
-                windowtext = ""
-            try:
-                coa = kernel32.OpenProcess(0x1000, 0, pid.value)
-                path = (ctypes.c_wchar * 260)()
-                size = ctypes.c_uint(260)
-                kernel32.QueryFullProcessImageNameW(coa, 0, path, byref(size))
-                filepath = path.value
-                ctypes.windll.kernel32.CloseHandle(coa)
-            except Exception as fe:
-                filepath = ""
-            if childcounter.rightnow is None:
-                assc = -1
-            else:
-                assc = childcounter.rightnow
-            result.append(
-                (
-                    WindowInfoxx(
-                        assc,
-                        pid.value,
-                        title.value,
-                        windowtext,
-                        hWnd,
-                        length,
-                        tid,
-                        status,
-                        coords_client,
-                        dim_client,
-                        coords_win,
-                        dim_win,
-                        classname,
-                        filepath,
-                    )
-                )
-            )
-            return True
-
-        enum_proc2(hwnd, 0)
-        return result
-
-    def WindowFromPoint(x, y):
-        """Return hwnd"""
-        x = int(x)
-        y = int(y)
-        point = POINT()
-        point.x = x
-        point.y = y
-
-        ac = ctypes.windll.user32.WindowFromPoint(point)
-        try:
-            return ac
-
-        except Exception as iu:
-            print(iu)
-            return []
+        return _window_info(hwnd, cache, paths)
 
     def GetParent(hWnd):
         """Get the handle of the specified window's parent window.
@@ -336,12 +532,7 @@ def get_all_infos_point(coordx=None, coordy=None, hwnd_=None):
         Returns:
             HWND: Handle to the parent window.
         """
-        _GetParent = ctypes.windll.user32.GetParent
-        _GetParent.argtypes = [HWND]
-        _GetParent.restype = HWND
-
-        hWndParent = _GetParent(hWnd)
-        return hWndParent
+        return _GetParent(hWnd)
 
     def GetAncestor(hWnd, gaFlags=1):
         """Get the handle of the ancestor window according to the specified flags.
@@ -353,12 +544,7 @@ def get_all_infos_point(coordx=None, coordy=None, hwnd_=None):
         Returns:
             HWND: Handle to the ancestor window.
         """
-        _GetAncestor = ctypes.windll.user32.GetAncestor
-        _GetAncestor.argtypes = [HWND, UINT]
-        _GetAncestor.restype = HWND
-
-        hWndParent = _GetAncestor(hWnd, gaFlags)
-        return hWndParent
+        return _GetAncestor(hWnd, gaFlags)
 
     def GetDesktopWindow():
         """Get the handle of the desktop window.
@@ -366,9 +552,6 @@ def get_all_infos_point(coordx=None, coordy=None, hwnd_=None):
         Returns:
             HWND: Handle to the desktop window.
         """
-        _GetDesktopWindow = ctypes.windll.user32.GetDesktopWindow
-        _GetDesktopWindow.argtypes = []
-        _GetDesktopWindow.restype = HWND
         return _GetDesktopWindow()
 
     def get_all_children(parent_hwnd):
@@ -378,101 +561,44 @@ def get_all_infos_point(coordx=None, coordy=None, hwnd_=None):
             parent_hwnd: Handle to the parent window.
 
         Returns:
-            list: A list of window handles (HWND) for all child windows.
+            array.array: The window handles (HWND) of all child windows.
         """
-        WNDENUMPROC = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, ctypes.py_object)
-
-        user32 = ctypes.WinDLL("user32")
-        user32.GetForegroundWindow.argtypes = ()
-        user32.GetForegroundWindow.restype = wintypes.HWND
-        user32.EnumChildWindows.argtypes = wintypes.HWND, WNDENUMPROC, ctypes.py_object
-        user32.EnumChildWindows.restype = wintypes.BOOL
-
-        @WNDENUMPROC
-        def callback(hwnd, obj):
-            obj.append(hwnd)
-            return True
-
-        obj = []
-
-        user32.EnumChildWindows(parent_hwnd, callback, obj)
+        # Handles are stored as 64-bit ints instead of list items, which keeps
+        # large child lists (tree views, grids, ...) compact.
+        obj = array.array("q")
+        _EnumChildWindows(parent_hwnd, _append_hwnd, obj)
         return obj
 
     if hwnd_ is None:
         pointx = coordx, coordy
-        co = WindowFromPoint(*pointx)
+        co = _WindowFromPoint(wintypes.POINT(int(coordx), int(coordy)))
     else:
         co = hwnd_
         pointx = 0, 0
-    child = find_elements(co)
-    dla = GetDesktopWindow()
-    child = [c for c in child if c.hwnd != dla]
+    x = find_elements(co)
     didi = {}
-    if child:
-        didi = {
-            pointx: {
-                "foundelement": ProtectedTuple(x),
-                "all_elements": [ProtectedTuple(e) for e in find_elements(x.hwnd)],
-                "ancestor": [ProtectedTuple(rr) for rr in find_elements(gg)]
-                if (gg := (GetAncestor(x.hwnd))) is not None
-                else None,
-                "parent": [ProtectedTuple(h) for h in find_elements(g)]
-                if (g := (GetParent(x.hwnd))) is not None
-                else None,
-                "all_children": [
-                    [ProtectedTuple(rr) for rr in find_elements(tra)]
-                    for tra in get_all_children(x.hwnd)
-                ],
-                "whole_family": list(
-                    j[0]
-                    for j in list(
-                        set(
-                            flatten_everything(
-                                [
-                                    ProtectedTuple(m)
-                                    for m in [
-                                    find_elements(r)
-                                    for r in list(
-                                        flatten_everything(
-                                            [
-                                                [
-                                                    list(
-                                                        set(
-                                                            [
-                                                                z
-                                                                for z in flatten_everything(
-                                                                GetParent(p)
-                                                            )
-                                                                if isinstance(
-                                                                z, int
-                                                            )
-                                                            ]
-                                                        )
-                                                    )
-                                                    for p in flatten_everything(
-                                                    [[y.hwnd for y in x]]
-                                                )
-                                                ]
-                                                for x in (
-                                                [
-                                                    find_elements(tra)
-                                                    for tra in get_all_children(
-                                                    x.hwnd
-                                                )
-                                                ]
-                                            )
-                                            ]
-                                        )
-                                    )
-                                ]
-                                ]
-                            )
-                        )
-                    )
-                ),
-            }
-            for x in child
-        }
+    if x.hwnd == GetDesktopWindow():
+        return didi
+    # The result keeps its original layout, where every window is wrapped in a
+    # one-element list.
+    children_results = [[find_elements(tra)] for tra in get_all_children(x.hwnd)]
+    parent_hwnds = set()
+    for (info,) in children_results:
+        p = GetParent(info.hwnd)
+        if isinstance(p, int) and p:
+            parent_hwnds.add(p)
+    didi[pointx] = {
+        "foundelement": x,
+        "all_elements": [x],
+        "ancestor": [find_elements(gg)]
+        if (gg := (GetAncestor(x.hwnd))) is not None
+        else None,
+        "parent": [find_elements(g)]
+        if (g := (GetParent(x.hwnd))) is not None
+        else None,
+        "all_children": children_results,
+        "whole_family": [find_elements(p) for p in parent_hwnds],
+    }
     return didi
 
 
@@ -502,6 +628,7 @@ def start_failsafe(hotkey="ctrl+e"):
     Args:
         hotkey: The key combination to trigger the failsafe kill. Defaults to 'ctrl+e'.
     """
+    import keyboard as key_b
     key_b.add_hotkey(hotkey, failsafe_kill)
 
 
@@ -687,12 +814,52 @@ VK_NONAME = 0xFC  # Reserved
 VK_PA1 = 0xFD  # PA1 key
 VK_OEM_CLEAR = 0xFE  # Clear key
 
+@functools.lru_cache(maxsize=512)
+def _norm(name):
+    """Normalize a key name to the spelling stored in allkeys.
+
+    Args:
+        name: A key name in any casing, with spaces or underscores between words.
+
+    Returns:
+        str: The lowercase name with underscores instead of spaces.
+    """
+    return name.lower().replace(" ", "_")
+
+
+class _KeyTable(dict):
+    """Dictionary of normalized key names that also accepts any other spelling.
+
+    Lookups that miss are retried with the normalized key (see _norm), so allkeys["ENTER"],
+    allkeys.get("Left Shift") and allkeys.get("left_shift") all work while every key is
+    stored only once.
+    """
+
+    def __missing__(self, key):
+        if isinstance(key, str) and dict.__contains__(self, _norm(key)):
+            return dict.__getitem__(self, _norm(key))
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (
+            isinstance(key, str) and dict.__contains__(self, _norm(key))
+        )
+
+
 # allkeys dictionary
 # Maps human-readable key names to their corresponding virtual key codes.
 # Provides an abstraction layer for easier key handling in the application.
-# Example: allkeys["enter"] retrieves the virtual key code for the ENTER key.
-allkeys = {
-    "control-break processing": 3,
+# Names are stored in lowercase with underscores only, lookups ignore casing and accept
+# spaces instead of underscores.
+# Example: allkeys["page_up"] (or allkeys["Page Up"]) retrieves the virtual key code for the PAGE UP key.
+allkeys = _KeyTable({
+    "control-break_processing": 3,
     "backspace": 8,
     "tab": 9,
     "clear": 254,
@@ -701,19 +868,19 @@ allkeys = {
     "ctrl": 17,
     "alt": 18,
     "pause": 19,
-    "caps lock": 20,
-    "ime hangul mode": 21,
-    "ime junja mode": 23,
-    "ime final mode": 24,
-    "ime kanji mode": 25,
+    "caps_lock": 20,
+    "ime_hangul_mode": 21,
+    "ime_junja_mode": 23,
+    "ime_final_mode": 24,
+    "ime_kanji_mode": 25,
     "esc": 27,
-    "ime convert": 28,
-    "ime nonconvert": 29,
-    "ime accept": 30,
-    "ime mode change request": 31,
+    "ime_convert": 28,
+    "ime_nonconvert": 29,
+    "ime_accept": 30,
+    "ime_mode_change_request": 31,
     "spacebar": 32,
-    "page up": 33,
-    "page down": 34,
+    "page_up": 33,
+    "page_down": 34,
     "end": 35,
     "home": 36,
     "left": 37,
@@ -723,7 +890,7 @@ allkeys = {
     "select": 41,
     "print": 42,
     "execute": 43,
-    "print screen": 44,
+    "print_screen": 44,
     "insert": 45,
     "delete": 46,
     "help": 47,
@@ -763,8 +930,8 @@ allkeys = {
     "x": 88,
     "y": 89,
     "z": 90,
-    "left windows": 91,
-    "right windows": 92,
+    "left_windows": 91,
+    "right_windows": 92,
     "applications": 93,
     "sleep": 95,
     "*": 106,
@@ -797,228 +964,6 @@ allkeys = {
     "f22": 133,
     "f23": 134,
     "f24": 135,
-    "num lock": 144,
-    "scroll lock": 145,
-    "left shift": 160,
-    "right shift": 161,
-    "left ctrl": 162,
-    "right ctrl": 163,
-    "left menu": 164,
-    "right menu": 165,
-    "browser back": 166,
-    "browser forward": 167,
-    "browser refresh": 168,
-    "browser stop": 169,
-    "browser search key": 170,
-    "browser favorites": 171,
-    "browser start and home": 172,
-    "volume mute": 173,
-    "volume down": 174,
-    "volume up": 175,
-    "next track": 176,
-    "previous track": 177,
-    "stop media": 178,
-    "play/pause media": 179,
-    "start mail": 180,
-    "select media": 181,
-    "start application 1": 182,
-    "start application 2": 183,
-    ",": 188,
-    ".": 190,
-    "ime process": 229,
-    "attn": 246,
-    "crsel": 247,
-    "exsel": 248,
-    "erase eof": 249,
-    "play": 250,
-    "zoom": 251,
-    "reserved ": 252,
-    "pa1": 253,
-    "CONTROL-BREAK PROCESSING": 3,
-    "BACKSPACE": 8,
-    "TAB": 9,
-    "CLEAR": 254,
-    "ENTER": 13,
-    "SHIFT": 16,
-    "CTRL": 17,
-    "ALT": 18,
-    "PAUSE": 19,
-    "CAPS LOCK": 20,
-    "IME HANGUL MODE": 21,
-    "IME JUNJA MODE": 23,
-    "IME FINAL MODE": 24,
-    "IME KANJI MODE": 25,
-    "ESC": 27,
-    "IME CONVERT": 28,
-    "IME NONCONVERT": 29,
-    "IME ACCEPT": 30,
-    "IME MODE CHANGE REQUEST": 31,
-    "SPACEBAR": 32,
-    "PAGE UP": 33,
-    "PAGE DOWN": 34,
-    "END": 35,
-    "HOME": 36,
-    "LEFT": 37,
-    "UP": 38,
-    "RIGHT": 39,
-    "DOWN": 40,
-    "SELECT": 41,
-    "PRINT": 42,
-    "EXECUTE": 43,
-    "PRINT SCREEN": 44,
-    "INSERT": 45,
-    "DELETE": 46,
-    "HELP": 47,
-    "A": 65,
-    "B": 66,
-    "C": 67,
-    "D": 68,
-    "E": 69,
-    "F": 70,
-    "G": 71,
-    "H": 72,
-    "I": 73,
-    "J": 74,
-    "K": 75,
-    "L": 76,
-    "M": 77,
-    "N": 78,
-    "O": 79,
-    "P": 80,
-    "Q": 81,
-    "R": 82,
-    "S": 83,
-    "T": 84,
-    "U": 85,
-    "V": 86,
-    "W": 87,
-    "X": 88,
-    "Y": 89,
-    "Z": 90,
-    "LEFT WINDOWS": 91,
-    "RIGHT WINDOWS": 92,
-    "APPLICATIONS": 93,
-    "SLEEP": 95,
-    "SEPARATOR": 108,
-    "DECIMAL": 110,
-    "F1": 112,
-    "F2": 113,
-    "F3": 114,
-    "F4": 115,
-    "F5": 116,
-    "F6": 117,
-    "F7": 118,
-    "F8": 119,
-    "F9": 120,
-    "F10": 121,
-    "F11": 122,
-    "F12": 123,
-    "F13": 124,
-    "F14": 125,
-    "F15": 126,
-    "F16": 127,
-    "F17": 128,
-    "F18": 129,
-    "F19": 130,
-    "F20": 131,
-    "F21": 132,
-    "F22": 133,
-    "F23": 134,
-    "F24": 135,
-    "NUM LOCK": 144,
-    "SCROLL LOCK": 145,
-    "LEFT SHIFT": 160,
-    "RIGHT SHIFT": 161,
-    "LEFT CTRL": 162,
-    "RIGHT CTRL": 163,
-    "LEFT MENU": 164,
-    "RIGHT MENU": 165,
-    "BROWSER BACK": 166,
-    "BROWSER FORWARD": 167,
-    "BROWSER REFRESH": 168,
-    "BROWSER STOP": 169,
-    "BROWSER SEARCH KEY": 170,
-    "BROWSER FAVORITES": 171,
-    "BROWSER START AND HOME": 172,
-    "VOLUME MUTE": 173,
-    "VOLUME DOWN": 174,
-    "VOLUME UP": 175,
-    "NEXT TRACK": 176,
-    "PREVIOUS TRACK": 177,
-    "STOP MEDIA": 178,
-    "PLAY/PAUSE MEDIA": 179,
-    "START MAIL": 180,
-    "SELECT MEDIA": 181,
-    "START APPLICATION 1": 182,
-    "START APPLICATION 2": 183,
-    "IME PROCESS": 229,
-    "ATTN": 246,
-    "CRSEL": 247,
-    "EXSEL": 248,
-    "ERASE EOF": 249,
-    "PLAY": 250,
-    "ZOOM": 251,
-    "RESERVED ": 252,
-    "PA1": 253,
-    "CONTROL-BREAK_PROCESSING": 3,
-    "CAPS_LOCK": 20,
-    "IME_HANGUL_MODE": 21,
-    "IME_JUNJA_MODE": 23,
-    "IME_FINAL_MODE": 24,
-    "IME_KANJI_MODE": 25,
-    "IME_CONVERT": 28,
-    "IME_NONCONVERT": 29,
-    "IME_ACCEPT": 30,
-    "IME_MODE_CHANGE_REQUEST": 31,
-    "PAGE_UP": 33,
-    "PAGE_DOWN": 34,
-    "PRINT_SCREEN": 44,
-    "LEFT_WINDOWS": 91,
-    "RIGHT_WINDOWS": 92,
-    "NUM_LOCK": 144,
-    "SCROLL_LOCK": 145,
-    "LEFT_SHIFT": 160,
-    "RIGHT_SHIFT": 161,
-    "LEFT_CTRL": 162,
-    "RIGHT_CTRL": 163,
-    "LEFT_MENU": 164,
-    "RIGHT_MENU": 165,
-    "BROWSER_BACK": 166,
-    "BROWSER_FORWARD": 167,
-    "BROWSER_REFRESH": 168,
-    "BROWSER_STOP": 169,
-    "BROWSER_SEARCH_KEY": 170,
-    "BROWSER_FAVORITES": 171,
-    "BROWSER_START_AND_HOME": 172,
-    "VOLUME_MUTE": 173,
-    "VOLUME_DOWN": 174,
-    "VOLUME_UP": 175,
-    "NEXT_TRACK": 176,
-    "PREVIOUS_TRACK": 177,
-    "STOP_MEDIA": 178,
-    "PLAY/PAUSE_MEDIA": 179,
-    "START_MAIL": 180,
-    "SELECT_MEDIA": 181,
-    "START_APPLICATION_1": 182,
-    "START_APPLICATION_2": 183,
-    "IME_PROCESS": 229,
-    "ERASE_EOF": 249,
-    "RESERVED_": 252,
-    "control-break_processing": 3,
-    "caps_lock": 20,
-    "ime_hangul_mode": 21,
-    "ime_junja_mode": 23,
-    "ime_final_mode": 24,
-    "ime_kanji_mode": 25,
-    "ime_convert": 28,
-    "ime_nonconvert": 29,
-    "ime_accept": 30,
-    "ime_mode_change_request": 31,
-    "page_up": 33,
-    "page_down": 34,
-    "print_screen": 44,
-    "left_windows": 91,
-    "right_windows": 92,
     "num_lock": 144,
     "scroll_lock": 145,
     "left_shift": 160,
@@ -1045,12 +990,26 @@ allkeys = {
     "select_media": 181,
     "start_application_1": 182,
     "start_application_2": 183,
+    ",": 188,
+    ".": 190,
     "ime_process": 229,
+    "attn": 246,
+    "crsel": 247,
+    "exsel": 248,
     "erase_eof": 249,
+    "play": 250,
+    "zoom": 251,
     "reserved_": 252,
-}
+    "pa1": 253,
+})
+
+# Reverse lookup of allkeys: virtual key code -> key name.
+# The first name listed for a code wins, e.g. KEY_NAMES[91] == "left_windows".
+KEY_NAMES = {}
+for _name, _vk in allkeys.items():
+    KEY_NAMES.setdefault(_vk, _name)
+del _name, _vk
 
-emptyLong = ctypes.c_ulong()  # Defines an unsigned long integer for low-level operations
 user32 = ctypes.WinDLL("user32", use_last_error=True)  # Loads the user32.dll for Windows API functions
 
 # Input types for SendInput function
@@ -1067,6 +1026,23 @@ KEYEVENTF_SCANCODE = 0x0008  # Indicates a scan code input
 # MapVirtualKey translation types
 MAPVK_VK_TO_VSC = 0  # Translates a virtual-key code to a scan code
 
+
+# The scan code of a virtual key depends on the keyboard layout, so the layout
+# (hkl) is part of the cache key.
+@functools.lru_cache(maxsize=512)
+def _vk_to_scan(vk, hkl):
+    """Get the scan code of a virtual key code for a keyboard layout.
+
+    Args:
+        vk: The virtual key code.
+        hkl: The keyboard layout handle, as returned by GetKeyboardLayout.
+
+    Returns:
+        int: The scan code, 0 if the key has none.
+    """
+    return _MapVirtualKeyExW(vk, MAPVK_VK_TO_VSC, hkl)
+
+
 # Mouse event flags
 MOUSEEVENTF_MOVE = 0x0001  # Indicates mouse movement
 MOUSEEVENTF_LEFTDOWN = 0x0002  # Indicates left mouse button press
@@ -1097,6 +1073,9 @@ class CURSORINFO(ctypes.Structure):
     ]
 
 
+_CURSORINFO_SIZE = ctypes.sizeof(CURSORINFO)
+
+
 class MOUSEINPUT(ctypes.Structure):
     """Ctypes structure for mouse input events used by the SendInput API.
 
@@ -1116,7 +1095,7 @@ class KEYBDINPUT(ctypes.Structure):
     """Ctypes structure for keyboard input events used by the SendInput API.
 
     Contains virtual key code, scan code, flags, timestamp, and extra info.
-    Auto-maps virtual key to scan code on init unless KEYEVENTF_UNICODE is set.
+    Use _make_keybd() to get one with the scan code of the virtual key filled in.
     """
     _fields_ = (
         ("wVk", wintypes.WORD),
@@ -1126,10 +1105,28 @@ class KEYBDINPUT(ctypes.Structure):
         ("dwExtraInfo", ULONG_PTR),
     )
 
-    def __init__(self, *args, **kwds):
-        super(KEYBDINPUT, self).__init__(*args, **kwds)
-        if not self.dwFlags & KEYEVENTF_UNICODE:
-            self.wScan = user32.MapVirtualKeyExW(self.wVk, MAPVK_VK_TO_VSC, 0)
+
+def _make_keybd(vk, flags=0, hkl=None):
+    """Build a KEYBDINPUT for a virtual key code.
+
+    The scan code is looked up for the keyboard layout hkl, unless KEYEVENTF_UNICODE is set.
+
+    Args:
+        vk: The virtual key code.
+        flags: KEYEVENTF_* flags. Defaults to 0.
+        hkl: The keyboard layout handle. Defaults to the layout of the calling thread.
+
+    Returns:
+        KEYBDINPUT: The keyboard input structure.
+    """
+    k = KEYBDINPUT()
+    k.wVk = vk
+    if not flags & KEYEVENTF_UNICODE:
+        if hkl is None:
+            hkl = _GetKeyboardLayout(0)
+        k.wScan = _vk_to_scan(vk, hkl)
+    k.dwFlags = flags
+    return k
 
 
 class HARDWAREINPUT(ctypes.Structure):
@@ -1211,6 +1208,40 @@ user32.SendInput.argtypes = (
     LPINPUT,  # pInputs
     ctypes.c_int,
 )  # cbSize
+_SendInput = user32.SendInput
+_INPUT_SIZE = ctypes.sizeof(INPUT)
+
+# The same function without the error check, for mouse moves, scan codes and
+# send_unicode. They ignore a return value of 0 (e.g. while a UAC prompt or the
+# lock screen blocks input) instead of raising in the middle of a movement.
+_SendInputUnchecked = _user32.SendInput
+_SendInputUnchecked.argtypes = user32.SendInput.argtypes
+_SendInputUnchecked.restype = wintypes.UINT
+
+# Key down/up INPUT structs built by _get_press_inputs, keyed by (VK code, keyboard layout)
+_PRESS_INPUTS = {}
+
+
+def _get_press_inputs(hexKeyCode):
+    """Get the key down and key up INPUT structs for a virtual key code.
+
+    The structs are built once per key and keyboard layout of the calling thread
+    and only read afterwards.
+
+    Args:
+        hexKeyCode: The virtual key code.
+
+    Returns:
+        tuple: The (key down, key up) INPUT structs.
+    """
+    hkl = _GetKeyboardLayout(0)
+    inputs = _PRESS_INPUTS.get((hexKeyCode, hkl))
+    if inputs is None:
+        inputs = _PRESS_INPUTS[hexKeyCode, hkl] = (
+            INPUT(type=INPUT_KEYBOARD, ki=_make_keybd(hexKeyCode, hkl=hkl)),
+            INPUT(type=INPUT_KEYBOARD, ki=_make_keybd(hexKeyCode, KEYEVENTF_KEYUP, hkl)),
+        )
+    return inputs
 
 
 def Press(keycode, delay=0.5):
@@ -1224,123 +1255,126 @@ def Press(keycode, delay=0.5):
         hexKeyCode = allkeys.get(keycode)
     else:
         hexKeyCode = keycode
-    x = INPUT(type=INPUT_KEYBOARD, ki=KEYBDINPUT(wVk=hexKeyCode))
-    user32.SendInput(1, ctypes.byref(x), ctypes.sizeof(x))
+    down, up = _get_press_inputs(hexKeyCode)
+    _SendInput(1, byref(down), _INPUT_SIZE)
     time.sleep(delay)
-    x = INPUT(
-        type=INPUT_KEYBOARD, ki=KEYBDINPUT(wVk=hexKeyCode, dwFlags=KEYEVENTF_KEYUP)
-    )
-    user32.SendInput(1, ctypes.byref(x), ctypes.sizeof(x))
+    _SendInput(1, byref(up), _INPUT_SIZE)
 
 
-class DUMMYUNIONNAME(Union):
-    """Union of MOUSEINPUT, KEYBDINPUT, and HARDWAREINPUT for the alternative SendInput path."""
-    _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT), ("hi", HARDWAREINPUT)]
+def press_sequence(keycodes):
+    """Press and release several keyboard keys one after another with a single SendInput call.
 
+    Unlike Press, the keys are not held down; every key is released before the next one is pressed.
+
+    Args:
+        keycodes: An iterable of key names (looked up in allkeys) or integer VK codes.
+    """
+    keycodes = [allkeys.get(k) if isinstance(k, str) else k for k in keycodes]
+    if not keycodes:
+        return
+    inputs = (INPUT * (2 * len(keycodes)))()
+    for ini, hexKeyCode in enumerate(keycodes):
+        inputs[2 * ini], inputs[2 * ini + 1] = _get_press_inputs(hexKeyCode)
+    _SendInput(len(inputs), inputs, _INPUT_SIZE)
 
-# Declares at a lower level a function SendInput(nInputs: int, pInputs: POINTER(INPUT), cbSize: int) -> int
-# This function is a high-level abstraction for the low-level Windows API SendInput function.
-# It allows sending synthetic input events (keyboard, mouse, or hardware) to the system.
-# Example:
-#     def send_input(nInputs: int, pInputs: POINTER(INPUT), cbSize: int) -> int:
-#         """
-#         High-level wrapper for the SendInput function.
-#         
-#         Args:
-#             nInputs: Number of input events to insert.
-#             pInputs: Pointer to an array of INPUT structures describing the input events.
-#             cbSize: Size of the INPUT structure in bytes.
-#         
-#         Returns:
-#             int: The number of events successfully inserted into the input stream.
-#         
-#         Raises:
-#             RuntimeError: If no events were successfully inserted.
-#         """
-#         result = lib.SendInput(nInputs, pInputs, cbSize)
-#         if result == 0:
-#             raise RuntimeError("Failed to send input events")
-#         return result
-lib = ctypes.WinDLL("user32")
-lib.SendInput.argtypes = wintypes.UINT, POINTER(INPUT), ctypes.c_int
-lib.SendInput.restype = wintypes.UINT
+
+@functools.lru_cache(maxsize=256)
+def _get_scancode_inputs(code):
+    """Get the press and release INPUT array of a scan code.
+
+    The arrays are cached per code and only read afterwards.
+
+    Args:
+        code: The hardware scan code.
+
+    Returns:
+        ctypes.Array: Two INPUT structs, key down and key up.
+    """
+    inputs = (INPUT * 2)()
+    for i, flags in zip(inputs, (KEYEVENTF_SCANCODE, KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP)):
+        i.type = INPUT_KEYBOARD
+        i.ki.wScan = code
+        i.ki.dwFlags = flags
+    return inputs
 
 
 def send_scancode(code):
     """Send a keyboard scan code via SendInput (press and release).
 
     Args:
-        code: The hardware scan code to send.
+        code: The hardware scan code to send.
+    """
+    _SendInputUnchecked(2, _get_scancode_inputs(code), _INPUT_SIZE)
+
+
+def send_scancode_sequence(codes):
+    """Press and release several scan codes one after another with a single SendInput call.
+
+    Args:
+        codes: An iterable of hardware scan codes.
     """
-    i = INPUT()
-    i.type = INPUT_KEYBOARD
-    i.ki = KEYBDINPUT(0, code, KEYEVENTF_SCANCODE, 0, 0)
-    lib.SendInput(1, byref(i), sizeof(INPUT))
-    i.ki.dwFlags |= KEYEVENTF_KEYUP
-    lib.SendInput(1, byref(i), sizeof(INPUT))
+    codes = list(codes)
+    if not codes:
+        return
+    inputs = (INPUT * (2 * len(codes)))()
+    for ini, code in enumerate(codes):
+        inputs[2 * ini], inputs[2 * ini + 1] = _get_scancode_inputs(code)
+    _SendInputUnchecked(len(inputs), inputs, _INPUT_SIZE)
 
 
 def send_unicode(s):
-    """Send a string as Unicode keyboard input, one character at a time.
+    """Send a string as Unicode keyboard input.
+
+    All key down/up events of the string are passed to a single SendInput call.
 
     Args:
         s: The string to type via Unicode keyboard events.
     """
-    i = INPUT()
-    i.type = INPUT_KEYBOARD
+    if not s:
+        return
+    inputs = (INPUT * (2 * len(s)))()
+    ini = 0
     for c in s:
-        i.ki = KEYBDINPUT(0, ord(c), KEYEVENTF_UNICODE, 0, 0)
-        lib.SendInput(1, byref(i), sizeof(INPUT))
-        i.ki.dwFlags |= KEYEVENTF_KEYUP
-        lib.SendInput(1, byref(i), sizeof(INPUT))
-
-
-
-class MouseInput(ctypes.Structure):
-    """Alternative ctypes structure for mouse input events used with the secondary SendInput path."""
-    _fields_ = [
-        ("dx", ctypes.c_long),
-        ("dy", ctypes.c_long),
-        ("mouseData", DWORD),
-        ("dwFlags", DWORD),
-        ("time", DWORD),
-        ("dwExtraInfo", ctypes.POINTER(ctypes.c_ulong)),
-    ]
-
-
-class KeybdInput(ctypes.Structure):
-    """Alternative ctypes structure for keyboard input events used with the secondary SendInput path."""
-    _fields_ = [
-        ("wVk", WORD),
-        ("wScan", WORD),
-        ("dwFlags", DWORD),
-        ("time", DWORD),
-        ("dwExtraInfo", ctypes.POINTER(ctypes.c_ulong)),
-    ]
-
-
-class HardwareInput(ctypes.Structure):
-    """Alternative ctypes structure for hardware input events used with the secondary SendInput path."""
-    _fields_ = [("uMsg", DWORD), ("wParamL", WORD), ("wParamH", WORD)]
-
+        scan = ord(c)
+        # The fields are written directly: with KEYEVENTF_UNICODE there is no
+        # scan code to look up, so _make_keybd() has nothing to do.
+        i = inputs[ini]
+        i.type = INPUT_KEYBOARD
+        i.ki.wScan = scan
+        i.ki.dwFlags = KEYEVENTF_UNICODE
+        i = inputs[ini + 1]
+        i.type = INPUT_KEYBOARD
+        i.ki.wScan = scan
+        i.ki.dwFlags = KEYEVENTF_UNICODE | KEYEVENTF_KEYUP
+        ini += 2
+    _SendInputUnchecked(len(inputs), inputs, _INPUT_SIZE)
 
-class InputList(ctypes.Union):
-    """Union that holds one of MouseInput, KeybdInput, or HardwareInput for the alternative input path."""
-    _fields_ = [("mi", MouseInput), ("ki", KeybdInput), ("hi", HardwareInput)]
 
-
-class Input(ctypes.Structure):
-    """Alternative ctypes structure for SendInput combining a type field and an InputList union."""
-    _fields_ = [("type", ctypes.c_ulong), ("inputList", InputList)]
+# Screen resolution returned by get_resolution(), None until the first call
+_resolution_cache = [None]
 
 
 def get_resolution():
     """Get the current screen resolution.
 
+    The resolution is only queried on the first call. Call invalidate_resolution_cache()
+    after the display settings changed.
+
     Returns:
         tuple: A (width, height) tuple of the screen resolution in pixels.
     """
-    return user32.GetSystemMetrics(0), user32.GetSystemMetrics(1)
+    resolution = _resolution_cache[0]
+    if resolution is None:
+        resolution = _resolution_cache[0] = (
+            user32.GetSystemMetrics(0),
+            user32.GetSystemMetrics(1),
+        )
+    return resolution
+
+
+def invalidate_resolution_cache():
+    """Forget the cached screen resolution, the next get_resolution() call queries it again."""
+    _resolution_cache[0] = None
 
 
 def move_rel(x, y):
@@ -1351,12 +1385,8 @@ def move_rel(x, y):
         y: Vertical offset in pixels (positive = down, negative = up).
     """
     mouseFlag = MOUSEEVENTF_MOVE
-    inputList = InputList()
-    inputList.mi = MouseInput(x, y, 0, mouseFlag, 0, ctypes.pointer(emptyLong))
-    windowsInput = Input(emptyLong, inputList)
-    ctypes.windll.user32.SendInput(
-        1, ctypes.pointer(windowsInput), ctypes.sizeof(windowsInput)
-    )
+    mouse_input = INPUT(type=INPUT_MOUSE, mi=MOUSEINPUT(x, y, 0, mouseFlag, 0, 0))
+    _SendInputUnchecked(1, byref(mouse_input), _INPUT_SIZE)
 
 
 def move(
@@ -1377,16 +1407,26 @@ def move(
     if not relative:
         mouseFlag |= MOUSEEVENTF_ABSOLUTE
         xr, yr = get_resolution()
-        x = floor(x / xr * 65535)
-        y = floor(y / yr * 65535)
-
-    inputList = InputList()
-    inputList.mi = MouseInput(x, y, 0, mouseFlag, 0, ctypes.pointer(emptyLong))
-
-    windowsInput = Input(emptyLong, inputList)
-    ctypes.windll.user32.SendInput(
-        1, ctypes.pointer(windowsInput), ctypes.sizeof(windowsInput)
+        # int() keeps float coordinates working, for ints the math stays exact
+        x = int(x * 65535 // xr)
+        y = int(y * 65535 // yr)
+
+    mouse_input = INPUT(type=INPUT_MOUSE, mi=MOUSEINPUT(x, y, 0, mouseFlag, 0, 0))
+    _SendInputUnchecked(1, byref(mouse_input), _INPUT_SIZE)
+
+
+# INPUT structs of all mouse button events, built once and only read afterwards
+_CLICK_INPUTS = {
+    flags: INPUT(type=INPUT_MOUSE, mi=MOUSEINPUT(0, 0, 0, flags, 0, 0))
+    for flags in (
+        MOUSEEVENTF_LEFTDOWN,
+        MOUSEEVENTF_LEFTUP,
+        MOUSEEVENTF_RIGHTDOWN,
+        MOUSEEVENTF_RIGHTUP,
+        MOUSEEVENTF_MIDDLEDOWN,
+        MOUSEEVENTF_MIDDLEUP,
     )
+}
 
 
 def _mouse_click(flags):
@@ -1395,14 +1435,46 @@ def _mouse_click(flags):
     Args:
         flags: MOUSEEVENTF_* flag(s) specifying the mouse action (e.g., LEFTDOWN, LEFTUP).
     """
-    x = INPUT(type=INPUT_MOUSE, mi=MOUSEINPUT(0, 0, 0, flags, 0, 0))
-    user32.SendInput(1, ctypes.byref(x), ctypes.sizeof(INPUT))
+    x = _CLICK_INPUTS.get(flags)
+    if x is None:
+        x = INPUT(type=INPUT_MOUSE, mi=MOUSEINPUT(0, 0, 0, flags, 0, 0))
+    _SendInput(1, byref(x), _INPUT_SIZE)
+
+
+# Down/up INPUT pairs of every button, sent together by clicks without delay
+_CLICK_PAIRS = {
+    down: (INPUT * 2)(_CLICK_INPUTS[down], _CLICK_INPUTS[up])
+    for down, up in (
+        (MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP),
+        (MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP),
+        (MOUSEEVENTF_MIDDLEDOWN, MOUSEEVENTF_MIDDLEUP),
+    )
+}
+
+
+def _mouse_button_click(down, up, delay):
+    """Press and release a mouse button.
+
+    With a delay of 0 or less, both events are passed to a single SendInput call.
+
+    Args:
+        down: The MOUSEEVENTF_*DOWN flag of the button.
+        up: The MOUSEEVENTF_*UP flag of the button.
+        delay: Time in seconds between mouse down and up events.
+    """
+    if delay <= 0:
+        _SendInput(2, _CLICK_PAIRS[down], _INPUT_SIZE)
+        return
+    _mouse_click(down)
+    time.sleep(delay)
+    _mouse_click(up)
 
 
 def calculate_all_coords(ends):
     """Calculate all integer pixel coordinates along a straight line between two points.
 
-    Uses Bresenham-style interpolation along the dominant axis.
+    Uses Bresenham-style interpolation along the dominant axis, computed in a single
+    pass for all directions.
 
     Args:
         ends: A 2x2 numpy array [[x0, y0], [x1, y1]].
@@ -1410,52 +1482,34 @@ def calculate_all_coords(ends):
     Returns:
         numpy.ndarray: An Nx2 array of (x, y) integer coordinates.
     """
-    d0, d1 = np.diff(ends, axis=0)[0]
-    
-    if d0 == 0 and d1 == 0:
+    import numpy as np
+    x0, y0 = int(ends[0, 0]), int(ends[0, 1])
+    d0, d1 = int(ends[1, 0]) - x0, int(ends[1, 1]) - y0
+    n = max(abs(d0), abs(d1))
+    if n == 0:
         return ends[[0]].astype(np.int32, copy=False)
-    
-    if d0 == 0:
-        return np.c_[
-            np.full(abs(d1) + 1, ends[0, 0], dtype=np.int32),
-            np.arange(ends[0, 1], ends[1, 1] + np.sign(d1), np.sign(d1), dtype=np.int32)
-        ]
-
-    if d1 == 0:
-        return np.c_[
-            np.arange(ends[0, 0], ends[1, 0] + np.sign(d0), np.sign(d0), dtype=np.int32),
-            np.full(abs(d0) + 1, ends[0, 1], dtype=np.int32)
-        ]
-    
-    if np.abs(d0) > np.abs(d1):
-        return np.c_[
-            np.arange(
-                ends[0, 0], ends[1, 0] + np.sign(d0), np.sign(d0), dtype=np.int32
-            ),
-            np.arange(
-                ends[0, 1] * np.abs(d0) + np.abs(d0) // 2,
-                ends[0, 1] * np.abs(d0) + np.abs(d0) // 2 + (np.abs(d0) + 1) * d1,
-                d1,
-                dtype=np.int32,
-            )
-            // np.abs(d0),
-        ]
-    else:
-        return np.c_[
-            np.arange(
-                ends[0, 0] * np.abs(d1) + np.abs(d1) // 2,
-                ends[0, 0] * np.abs(d1) + np.abs(d1) // 2 + (np.abs(d1) + 1) * d0,
-                d0,
-                dtype=np.int32,
-            )
-            // np.abs(d1),
-            np.arange(
-                ends[0, 1], ends[1, 1] + np.sign(d1), np.sign(d1), dtype=np.int32
-            ),
-        ]
 
+    # One step of t moves the dominant axis by exactly one pixel, the other axis
+    # is rounded to the nearest pixel; straight lines are the case d == 0.
+    t = np.arange(n + 1, dtype=np.int64)
+    out = np.empty((n + 1, 2), dtype=np.int32)
+    out[:, 0] = x0 + (t * d0 + n // 2) // n
+    out[:, 1] = y0 + (t * d1 + n // 2) // n
+    return out
+
+
+@functools.lru_cache(maxsize=None)
+def _get_rng():
+    """Get the numpy random Generator shared by the path functions.
+
+    Returns:
+        numpy.random.Generator: The generator, created on the first call.
+    """
+    import numpy as np
+    return np.random.default_rng()
 
-def add_random_n_places(a, n, low=-10, high=10):
+
+def add_random_n_places(a, n, low=-10, high=10, out=None):
     """Add random integer offsets to n randomly chosen elements of an array.
 
     Args:
@@ -1463,13 +1517,24 @@ def add_random_n_places(a, n, low=-10, high=10):
         n: Number of elements to perturb.
         low: Lower bound (inclusive) for random offsets. Defaults to -10.
         high: Upper bound (exclusive) for random offsets. Defaults to 10.
+        out: Integer array to write the result to, may be a itself. Defaults to None
+             (a copy of a is made, converted to int unless a already holds signed ints).
 
     Returns:
-        numpy.ndarray: A copy of the array with random offsets applied.
+        numpy.ndarray: The array with random offsets applied (out, if given).
     """
-    out = a.astype(int)
-    idx = np.random.choice(a.size, n, replace=False)
-    out.flat[idx] += np.random.randint(low=low, high=high, size=n)
+    if out is None:
+        out = a.copy() if a.dtype.kind == "i" else a.astype(int)
+    elif out is not a:
+        out[...] = a
+    if n <= 0:
+        return out
+    rng = _get_rng()
+    if n == out.size:
+        out += rng.integers(low, high, size=out.shape, dtype=out.dtype)
+        return out
+    idx = rng.choice(out.size, n, replace=False, shuffle=False)
+    out.flat[idx] += rng.integers(low, high, size=n, dtype=out.dtype)
     return out
 
 
@@ -1498,6 +1563,7 @@ def natural_mouse_movement(
         print_coords: Whether to print coordinates during movement. Defaults to True.
         percent: Percentage of path points to apply random variation to. Defaults to 90.
     """
+    import numpy as np
     nowx, nowy = get_cursor()
     coordtomove = x, y
     futx, futy = coordtomove
@@ -1509,18 +1575,68 @@ def natural_mouse_movement(
         n=int(alla.shape[0] * percent / 100),
         low=min_variation,
         high=max_variation,
+        out=alla,
+    )
+    # Same rows as np.repeat(alla, 4, axis=0)[::use_every] followed by the target,
+    # written into one preallocated array
+    idx = np.arange(0, 4 * alla.shape[0], use_every) // 4
+    path = np.empty((idx.shape[0] + 1, 2), dtype=alla.dtype)
+    np.take(alla, idx, axis=0, out=path[:-1])
+    path[-1] = futx, futy
+    alla = path[_log_split_last_indices(path.shape[0])]
+
+    # SendInput expects absolute coordinates normalized to 0..65535, widened
+    # first so that x * 65535 can't overflow an int32 path
+    xr, yr = get_resolution()
+    normalized = alla.astype(np.int64) * 65535 // np.array([xr, yr])
+    mouse_input = INPUT(
+        type=INPUT_MOUSE,
+        mi=MOUSEINPUT(0, 0, 0, MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE, 0, 0),
     )
-    alla = np.repeat(alla, 4, axis=0)
-    alla = alla[::use_every]
-    alla = np.vstack([alla, [futx, futy]])
-    alla = np.array(list(reversed(tuple([p[-1] for p in log_split(reversed(alla))]))))
+    sleeps = _get_rng().uniform(*sleeptime, size=alla.shape[0])
+    if print_coords:
+        _move_path_verbose(mouse_input, normalized, alla, sleeps)
+    else:
+        _move_path_silent(mouse_input, normalized, sleeps)
+
+
+def _move_path_silent(mouse_input, path, sleeps):
+    """Send one mouse move per path step, reusing a single INPUT struct.
+
+    Args:
+        mouse_input: The mouse INPUT struct to send; its MOUSEEVENTF_* flags are already set.
+        path: An Nx2 numpy array of dx/dy values to send.
+        sleeps: A numpy array with the sleep time in seconds after each step.
+    """
+    mi = mouse_input.mi
+    mouse_input_ref = byref(mouse_input)
+    # Local names, the loop runs once per path step
+    send_input, input_size, time_sleep = _SendInputUnchecked, _INPUT_SIZE, time.sleep
+    for (dx, dy), sleep in zip(path.tolist(), sleeps.tolist()):
+        mi.dx = dx
+        mi.dy = dy
+        send_input(1, mouse_input_ref, input_size)
+        time_sleep(sleep)
 
-    for x in alla:
-        if print_coords:
-            print(f"{x}         ", end="\r")
 
-        move(int(x[0]), int(x[1]))
-        time.sleep(uniform(*sleeptime))
+def _move_path_verbose(mouse_input, path, coords, sleeps):
+    """Same as _move_path_silent, but prints the coordinates of every step.
+
+    Args:
+        mouse_input: The mouse INPUT struct to send; its MOUSEEVENTF_* flags are already set.
+        path: An Nx2 numpy array of dx/dy values to send.
+        coords: An Nx2 numpy array with the coordinates to print for each step.
+        sleeps: A numpy array with the sleep time in seconds after each step.
+    """
+    mi = mouse_input.mi
+    mouse_input_ref = byref(mouse_input)
+    send_input, input_size, time_sleep = _SendInputUnchecked, _INPUT_SIZE, time.sleep
+    for (dx, dy), x, sleep in zip(path.tolist(), coords, sleeps.tolist()):
+        print(f"{x}         ", end="\r")
+        mi.dx = dx
+        mi.dy = dy
+        send_input(1, mouse_input_ref, input_size)
+        time_sleep(sleep)
 
 
 def left_click_xy_natural_relative(
@@ -1573,6 +1689,44 @@ def log_split(*args):
             yield list(x)
 
 
+def _log_split_last_indices(n):
+    """Get the indices that log_split keeps when thinning a path from its end.
+
+    Equivalent to reversing range(n), splitting it with log_split, taking the last
+    element of every chunk and reversing the result again. The chunks have the sizes
+    1, 2, 3, ..., so the kept positions (counted from the end) are the triangular
+    numbers minus one, plus the first element of the path.
+
+    Args:
+        n: Length of the path.
+
+    Returns:
+        numpy.ndarray: The kept indices in ascending order.
+    """
+    import numpy as np
+    chunks = (isqrt(8 * n + 1) - 1) // 2
+    if chunks * (chunks + 1) // 2 < n:
+        chunks += 1
+    k = np.arange(1, chunks + 1)
+    return (n - np.minimum(k * (k + 1) // 2, n))[::-1]
+
+
+def _log_split_sizes(n):
+    """Get the chunk sizes log_split produces for an iterable of length n, without building the chunks.
+
+    Args:
+        n: Length of the iterable.
+
+    Yields:
+        int: The sizes 1, 2, 3, ..., the last one cut to the remaining elements.
+    """
+    size = 1
+    while n > 0:
+        yield min(size, n)
+        n -= size
+        size += 1
+
+
 def natural_mouse_movement_relative(
         x,
         y,
@@ -1589,21 +1743,25 @@ def natural_mouse_movement_relative(
         sleeptime: Tuple of (min, max) sleep between movement steps. Defaults to (0.00005, 0.00009).
         print_coords: Whether to print coordinates during movement. Defaults to True.
     """
+    import numpy as np
     nowx, nowy = 0, 0
     coordtomove = x * 2, y * 2
     futx, futy = coordtomove
     allco = np.array([[nowx, nowy], [futx, futy]])
-    alla = calculate_all_coords(allco)
-    alla = np.vstack([alla, [futx, futy]])
-    difa1 = np.diff(alla[..., 0], prepend=0)
-    difa2 = np.diff(alla[..., 1], prepend=0)
-    alla = np.vstack([difa1, difa2]).T
-    for x in alla:
-        if print_coords:
-            print(f"{x}         ", end="\r")
-
-        move_rel(int(x[0]), int(x[1]))
-        time.sleep(uniform(*sleeptime))
+    path = calculate_all_coords(allco)
+    # Offsets between consecutive points (the first one from 0, 0), with the
+    # target appended to the path, filled into one preallocated array
+    n = path.shape[0]
+    alla = np.empty((n + 1, 2), dtype=path.dtype)
+    alla[0] = path[0]
+    np.subtract(path[1:], path[:-1], out=alla[1:n])
+    alla[n] = futx - path[-1, 0], futy - path[-1, 1]
+    mouse_input = INPUT(type=INPUT_MOUSE, mi=MOUSEINPUT(0, 0, 0, MOUSEEVENTF_MOVE, 0, 0))
+    sleeps = _get_rng().uniform(*sleeptime, size=alla.shape[0])
+    if print_coords:
+        _move_path_verbose(mouse_input, alla, alla, sleeps)
+    else:
+        _move_path_silent(mouse_input, alla, sleeps)
 
 
 def left_click(delay=0.1):
@@ -1612,9 +1770,7 @@ def left_click(delay=0.1):
     Args:
         delay: Time in seconds between mouse down and up events. Defaults to 0.1.
     """
-    _mouse_click(MOUSEEVENTF_LEFTDOWN)
-    time.sleep(delay)
-    _mouse_click(MOUSEEVENTF_LEFTUP)
+    _mouse_button_click(MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP, delay)
 
 
 def left_mouse_down():
@@ -1702,9 +1858,7 @@ def right_click(delay=0.1):
     Args:
         delay: Time in seconds between mouse down and up events. Defaults to 0.1.
     """
-    _mouse_click(MOUSEEVENTF_RIGHTDOWN)
-    time.sleep(delay)
-    _mouse_click(MOUSEEVENTF_RIGHTUP)
+    _mouse_button_click(MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP, delay)
 
 
 def right_click_xy(x, y, delay=0.1):
@@ -1787,9 +1941,7 @@ def middle_click(delay=0.1):
     Args:
         delay: Time in seconds between mouse down and up events. Defaults to 0.1.
     """
-    _mouse_click(MOUSEEVENTF_MIDDLEDOWN)
-    time.sleep(delay)
-    _mouse_click(MOUSEEVENTF_MIDDLEUP)
+    _mouse_button_click(MOUSEEVENTF_MIDDLEDOWN, MOUSEEVENTF_MIDDLEUP, delay)
 
 
 def middle_click_xy(x, y, delay=0.1):
@@ -1875,7 +2027,7 @@ def is_cursor_shown():
     GetCursorInfo = ctypes.windll.user32.GetCursorInfo
     GetCursorInfo.argtypes = [ctypes.POINTER(CURSORINFO)]
     info = CURSORINFO()
-    info.cbSize = ctypes.sizeof(info)
+    info.cbSize = _CURSORINFO_SIZE
     if GetCursorInfo(ctypes.byref(info)):
         if info.flags & 0x00000001:
             return True
@@ -1888,20 +2040,11 @@ def get_active_window():
     Returns:
         WindowInfo: A namedtuple with details about the active window, or an empty list if not found.
     """
-    pid = ctypes.wintypes.DWORD()
     active = ctypes.windll.user32.GetForegroundWindow()
-    active_window = ctypes.windll.user32.GetWindowThreadProcessId(
-        active, ctypes.byref(pid)
-    )
-    ac = {"pid": pid.value, "foreground": active, "active_window": active_window}
+    if not active:
+        return []
     try:
-        return [
-            x
-            for x in get_window_infos()
-            if x.pid == ac["pid"]
-               and x.hwnd == ac["foreground"]
-               and x.tid == ac["active_window"]
-        ][0]
+        return _TopWindowInfo._make(_window_info(active)[1:])
     except Exception:
         return []
 
@@ -2106,6 +2249,9 @@ ascii_vk = {
 }
 ascii_vk.update(dict((c, ord(c)) for c in string.ascii_uppercase + string.digits))
 ascii_vk.update(dict((c, ord(c.upper())) for c in string.ascii_lowercase))
+# Brace codes that are sent as virtual keys when vk_packet is off: the named
+# CODES take precedence over single ascii characters
+_CODES_AND_ASCII_VK = {**ascii_vk, **CODES}
 
 """
 
@@ -2169,7 +2315,7 @@ class INPUTX(Structure):
     ]
 
 
-# Declares at a lower level a function SendInput(nInputs: int, pInputs: POINTER(INPUT), cbSize: int) -> int
+# Declares at a lower level a function SendInput(nInputs: int, pInputs: POINTER(INPUTX), cbSize: int) -> int
 # This function is a high-level abstraction for the low-level Windows API SendInput function.
 # It allows sending synthetic input events (keyboard, mouse, or hardware) to the system.
 # Example:
@@ -2193,13 +2339,15 @@ class INPUTX(Structure):
 #             raise RuntimeError("Failed to send input events")
 #         return result
 #
-SendInput = ctypes.windll.user32.SendInput
-SendInput.restype = wintypes.UINT
-SendInput.argtypes = [
+# Built as its own prototype on the private _user32 handle, so the POINTER(INPUTX)
+# argument neither changes ctypes.windll.user32.SendInput for other modules of the
+# process nor the LPINPUT prototype of _user32.SendInput.
+SendInput = ctypes.WINFUNCTYPE(
     wintypes.UINT,
-    ctypes.c_void_p,  # using POINTER(win32structures.INPUT) needs rework in keyboard.py
+    wintypes.UINT,
+    POINTER(INPUTX),
     ctypes.c_int,
-]
+)(("SendInput", _user32))
 
 # Declares at a lower level a function GetMessageExtraInfo() -> int
 # This function retrieves extra message information for the current thread's message queue.
@@ -2215,6 +2363,85 @@ SendInput.argtypes = [
 GetMessageExtraInfo = ctypes.windll.user32.GetMessageExtraInfo
 
 
+_INPUTX_SIZE = ctypes.sizeof(INPUTX)
+# it seems to return 0 every time but it's required by MSDN specification
+# so call it just in case (once, the value is reused for all key events)
+_MESSAGE_EXTRA_INFO = GetMessageExtraInfo()
+
+
+@functools.lru_cache(maxsize=1024)
+def _key_input_template(vk, scan, flags, count, up):
+    """Return the raw bytes of the count INPUTX structures of a key action"""
+    inputs = (INPUTX * count)()
+    for inp in inputs:
+        inp.type = INPUT_KEYBOARD
+
+        inp.ki.wVk = vk
+        inp.ki.wScan = scan
+        inp.ki.dwFlags = flags
+        inp.ki.dwExtraInfo = _MESSAGE_EXTRA_INFO
+
+    # if we are releasing - then let it up
+    if up:
+        inputs[-1].ki.dwFlags |= KEYEVENTF_KEYUP
+
+    return bytes(inputs)
+
+
+def _send_inputx(inputs):
+    """Send an INPUTX array with one SendInput call, raise RuntimeError if not all events were inserted"""
+    # SendInput() supports all Unicode symbols
+    num_inserted_events = SendInput(
+        len(inputs), inputs, _INPUTX_SIZE
+    )
+    if num_inserted_events != len(inputs):
+        raise RuntimeError(
+            "SendInput() inserted only "
+            + str(num_inserted_events)
+            + " out of "
+            + str(len(inputs))
+            + " keyboard events"
+        )
+
+
+def _send_key_batch(actions):
+    """Send the INPUT structures of several KeyActions with one SendInput call"""
+    inputs = (INPUTX * sum(k.get_input_count() for k in actions))()
+    index = 0
+    for k in actions:
+        index = k.fill_input(inputs, index)
+    _send_inputx(inputs)
+
+
+# Flags of every virtual key: keys 33-46 and 91-93 have the extended flag set,
+# copied more or less verbatim from
+# http://www.pinvoke.net/default.aspx/user32.sendinput
+_EXTENDED_KEY_FLAGS = bytes(
+    KEYEVENTF_EXTENDEDKEY if 33 <= vk <= 46 or 91 <= vk <= 93 else 0 for vk in range(256)
+)
+
+
+# The results depend on the keyboard layout of the calling thread, so the
+# layout (hkl) is part of the cache key.
+def _map_vk(vk, hkl):
+    """Return the scan code of a virtual key for the layout hkl, see _vk_to_scan"""
+    return _vk_to_scan(vk, hkl)
+
+
+@functools.lru_cache(maxsize=512)
+def _vk_key_scan(ch, hkl):
+    """Return the virtual key of a character (low byte of VkKeyScanW) for the current layout, hkl is only the cache key"""
+    return VkKeyScanW(ch) & 0xFF
+
+
+@functools.lru_cache(maxsize=512)
+def _char_key_info(ch, hkl):
+    """Return the virtual key, shift state and scan code of a character (VkKeyScanExW) for the layout hkl"""
+    vk_with_flags = VkKeyScanExW(ch, hkl)
+    vk = vk_with_flags & 0xFF
+    return vk, (vk_with_flags & 0xFF00) >> 8, _vk_to_scan(vk, hkl)
+
+
 class KeyAction(object):
     """
     Class that represents a single keyboard action
@@ -2225,8 +2452,6 @@ class KeyAction(object):
 
     def __init__(self, key, down=True, up=True):
         self.key = key
-        if isinstance(self.key, six.string_types):
-            self.key = six.text_type(key)
         self.down = down
         self.up = up
 
@@ -2244,50 +2469,35 @@ class KeyAction(object):
         """
         return self._get_key_info()
 
-    def GetInput(self):
-        """Build the INPUT structure for the action"""
-        actions = 1
+    def get_input_count(self):
+        """Return the number of INPUT structures the action needs"""
         # if both up and down
         if self.up and self.down:
-            actions = 2
+            return 2
+        return 1
 
-        inputs = (INPUTX * actions)()
+    def fill_input(self, inputs, index):
+        """Write the INPUT structures of the action into inputs, starting at index
 
+        Returns the index after the last written structure.
+        """
         vk, scan, flags = self._get_key_info()
+        count = self.get_input_count()
+        template = _key_input_template(vk, scan, flags, count, bool(self.up))
+        ctypes.memmove(
+            ctypes.addressof(inputs) + index * _INPUTX_SIZE, template, len(template)
+        )
+        return index + count
 
-        for inp in inputs:
-            inp.type = INPUT_KEYBOARD
-
-            inp.ki.wVk = vk
-            inp.ki.wScan = scan
-            inp.ki.dwFlags |= flags
-
-            # it seems to return 0 every time but it's required by MSDN specification
-            # so call it just in case
-            inp.ki.dwExtraInfo = GetMessageExtraInfo()
-
-        # if we are releasing - then let it up
-        if self.up:
-            inputs[-1].ki.dwFlags |= KEYEVENTF_KEYUP
-
+    def GetInput(self):
+        """Build the INPUT structure for the action"""
+        inputs = (INPUTX * self.get_input_count())()
+        self.fill_input(inputs, 0)
         return inputs
 
     def run(self):
         """Execute the action"""
-        inputs = self.GetInput()
-
-        # SendInput() supports all Unicode symbols
-        num_inserted_events = SendInput(
-            len(inputs), ctypes.byref(inputs), ctypes.sizeof(INPUTX)
-        )
-        if num_inserted_events != len(inputs):
-            raise RuntimeError(
-                "SendInput() inserted only "
-                + str(num_inserted_events)
-                + " out of "
-                + str(len(inputs))
-                + " keyboard events"
-            )
+        _send_inputx(self.GetInput())
 
     def _get_down_up_string(self):
         """Return a string that will show whether the string is up or down
@@ -2338,25 +2548,12 @@ class VirtualKeyAction(KeyAction):
 
     def _get_key_info(self):
         """Virtual keys have extended flag set"""
-        # copied more or less verbatim from
-        # http://www.pinvoke.net/default.aspx/user32.sendinput
-        if 33 <= self.key <= 46 or 91 <= self.key <= 93:
-            flags = KEYEVENTF_EXTENDEDKEY
-        else:
-            flags = 0
+        flags = _EXTENDED_KEY_FLAGS[self.key]
         # This works for %{F4} - ALT + F4
         # return self.key, 0, 0
 
         # this works for Tic Tac Toe i.e. +{RIGHT} SHIFT + RIGHT
-        return self.key, MapVirtualKeyW(self.key, 0), flags
-
-    def run(self):
-        """Execute the action"""
-        # it works more stable for virtual keys than SendInput
-        for inp in self.GetInput():
-            # send_scancode(inp)
-            Press(inp.ki.wVk)
-            # win32api.keybd_event(inp.ki.wVk, inp.ki.wScan, inp.ki.dwFlags)
+        return self.key, _map_vk(self.key, GetKeyboardLayout(0)), flags
 
 
 class EscapedKeyAction(KeyAction):
@@ -2370,20 +2567,52 @@ class EscapedKeyAction(KeyAction):
 
         The vk and scan code are generated differently.
         """
-        vkey_scan = LoByte(VkKeyScanW(self.key))
+        hkl = GetKeyboardLayout(0)
+        vkey_scan = _vk_key_scan(self.key, hkl)
 
-        return (vkey_scan, MapVirtualKeyW(vkey_scan, 0), 0)
+        return (vkey_scan, _map_vk(vkey_scan, hkl), 0)
 
     def key_description(self):
         """Return a description of the key"""
         return "KEsc {}".format(self.key)
 
-    def run(self):
-        """Execute the action"""
-        # it works more stable for virtual keys than SendInput
-        for inp in self.GetInput():
-            # win32api.keybd_event(inp.ki.wVk, inp.ki.wScan, inp.ki.dwFlags)
-            Press(inp.ki.wVk)
+
+class RepeatAction(KeyAction):
+    """Represents a key action that is repeated a number of times e.g. {DOWN 5}
+
+    The INPUT structures of the action are built once and copied for
+    every repetition. Only used by send_keys, parse_keys returns the
+    repeated actions one by one.
+    """
+
+    def __init__(self, action, count):
+        self.action = action
+        self.count = count
+
+    def get_input_count(self):
+        """Return the number of INPUT structures the action needs"""
+        return self.action.get_input_count() * self.count
+
+    def fill_input(self, inputs, index):
+        """Write the INPUT structures of all repetitions into inputs, starting at index
+
+        Returns the index after the last written structure.
+        """
+        end = self.action.fill_input(inputs, index)
+        size = (end - index) * _INPUTX_SIZE
+        address = ctypes.addressof(inputs) + index * _INPUTX_SIZE
+        for i in range(1, self.count):
+            ctypes.memmove(address + i * size, address, size)
+        return index + (end - index) * self.count
+
+    def key_description(self):
+        """Return a description of the key"""
+        return self.action.key_description()
+
+    def __str__(self):
+        return "{} x{}".format(self.action, self.count)
+
+    __repr__ = __str__
 
 
 class PauseAction(KeyAction):
@@ -2405,14 +2634,12 @@ class PauseAction(KeyAction):
 def handle_code(code, vk_packet):
     """Handle a key or sequence of keys in braces"""
     code_keys = []
-    if code in CODES:
-        code_keys.append(VirtualKeyAction(CODES[code]))
+    vk = (CODES if vk_packet else _CODES_AND_ASCII_VK).get(code)
+    if vk is not None:
+        code_keys.append(VirtualKeyAction(vk))
 
     elif len(code) == 1:
-        if not vk_packet and code in ascii_vk:
-            code_keys.append(VirtualKeyAction(ascii_vk[code]))
-        else:
-            code_keys.append(KeyAction(code))
+        code_keys.append(KeyAction(code))
 
     # it is a repetition or a pause  {DOWN 5}, {PAUSE 1.3}
     elif " " in code:
@@ -2448,6 +2675,20 @@ def handle_code(code, vk_packet):
     return code_keys
 
 
+# Tokens of a key sequence, tried in this order at every position:
+# a modifier, a (group), a {code}, an unmatched ( or { and any other character.
+# The first character inside braces may be "}" itself, for the case {}}.
+_KEY_RE = re.compile(r"([+^%])|\(([^)]*)\)|\{(.[^}]*)\}|(\()|(\{)|(.)", re.DOTALL)
+(
+    _TOKEN_MODIFIER,
+    _TOKEN_GROUP,
+    _TOKEN_BRACE,
+    _TOKEN_OPEN_GROUP,
+    _TOKEN_OPEN_BRACE,
+    _TOKEN_CHAR,
+) = range(1, 7)
+
+
 def parse_keys(
         string,
         with_spaces=False,
@@ -2458,19 +2699,33 @@ def parse_keys(
         activate_window_before=True,
 ):
     """Return the parsed keys"""
+    if modifiers is None:
+        # Top level calls only depend on their arguments, so the parse result
+        # is cached and a fresh copy of the actions is returned every time.
+        keys = []
+        for cls, attrs in _parse_key_templates(
+                string, with_spaces, with_tabs, with_newlines, vk_packet
+        ):
+            if cls is RepeatAction:
+                template, count = attrs
+                keys.extend([_new_action(*template)] * count)
+            else:
+                keys.append(_new_action(cls, attrs))
+        return keys
 
     keys = []
     if not modifiers:
         modifiers = []
+    # Modifiers pressed by an enclosing (group) stay down until the whole
+    # group has been typed, only the ones pressed here are released.
+    held_modifiers = len(modifiers)
 
     should_escape_next_keys = False
-    index = 0
-    while index < len(string):
-
-        c = string[index]
-        index += 1
+    for match in _KEY_RE.finditer(string):
+        token = match.lastindex
+        c = match.group(token)
         # check if one of CTRL, SHIFT, ALT has been pressed
-        if c in MODIFIERS.keys():
+        if token == _TOKEN_MODIFIER:
             modifier = MODIFIERS[c]
             # remember that we are currently modified
             modifiers.append(modifier)
@@ -2481,27 +2736,15 @@ def parse_keys(
             continue
 
         # Apply modifiers over a bunch of characters (not just one!)
-        elif c == "(":
-            # find the end of the bracketed text
-            end_pos = string.find(")", index)
-            if end_pos == -1:
-                raise KeySequenceError("`)` not found")
-            keys.extend(
-                parse_keys(
-                    string[index:end_pos], modifiers=modifiers, vk_packet=vk_packet
-                )
-            )
-            index = end_pos + 1
+        elif token == _TOKEN_GROUP:
+            keys.extend(parse_keys(c, modifiers=modifiers, vk_packet=vk_packet))
+
+        elif token == _TOKEN_OPEN_GROUP:
+            raise KeySequenceError("`)` not found")
 
         # Escape or named key
-        elif c == "{":
-            # We start searching from index + 1 to account for the case {}}
-            end_pos = string.find("}", index + 1)
-            if end_pos == -1:
-                raise KeySequenceError("`}` not found")
-
-            code = string[index:end_pos]
-            index = end_pos + 1
+        elif token == _TOKEN_BRACE:
+            code = c
             key_events = [" up", " down"]
             current_key_event = None
             if any(key_event in code.lower() for key_event in key_events):
@@ -2509,7 +2752,7 @@ def parse_keys(
                 should_escape_next_keys = True
             current_keys = handle_code(code, vk_packet)
             if current_key_event is not None:
-                if isinstance(current_keys[0].key, six.string_types):
+                if isinstance(current_keys[0].key, str):
                     current_keys[0] = EscapedKeyAction(current_keys[0].key)
 
                 if current_key_event.strip() == "up":
@@ -2518,6 +2761,9 @@ def parse_keys(
                     current_keys[0].up = False
             keys.extend(current_keys)
 
+        elif token == _TOKEN_OPEN_BRACE:
+            raise KeySequenceError("`}` not found")
+
         # unmatched ")"
         elif c == ")":
             raise KeySequenceError("`)` should be preceeded by `(`")
@@ -2560,18 +2806,56 @@ def parse_keys(
                 keys.append(KeyAction(c))
 
         # as we have handled the text - release the modifiers
-        while modifiers:
+        while len(modifiers) > held_modifiers:
             if DEBUG:
                 print("MODS-", modifiers)
             keys.append(VirtualKeyAction(modifiers.pop(), down=False))
 
     # just in case there were any modifiers left pressed - release them
-    while modifiers:
+    while len(modifiers) > held_modifiers:
         keys.append(VirtualKeyAction(modifiers.pop(), down=False))
 
     return keys
 
 
+@functools.lru_cache(maxsize=512)
+def _parse_key_templates(string, with_spaces, with_tabs, with_newlines, vk_packet):
+    """Parse keys once and return them as an immutable (class, attributes) template
+
+    A pause is stored as (None, seconds). A run of the same action, as produced
+    by {DOWN 5}, is stored once as (RepeatAction, (template, count)).
+    """
+    keys = parse_keys(
+        string, with_spaces, with_tabs, with_newlines, modifiers=[], vk_packet=vk_packet
+    )
+    templates = []
+    for _, run in itertools.groupby(keys, key=id):
+        k = next(run)
+        if type(k) is PauseAction:
+            templates.append((None, k.how_long))
+            templates.extend((None, k.how_long) for _ in run)
+            continue
+        template = (type(k), tuple(vars(k).items()))
+        count = 1 + sum(1 for _ in run)
+        if count > 1:
+            templates.append((RepeatAction, (template, count)))
+        else:
+            templates.append(template)
+    return tuple(templates)
+
+
+def _new_action(cls, attrs):
+    """Create an action of class cls from a template of _parse_key_templates"""
+    if cls is None:
+        return PauseAction(attrs)
+    if cls is RepeatAction:
+        template, count = attrs
+        return RepeatAction(_new_action(*template), count)
+    action = cls.__new__(cls)
+    action.__dict__.update(attrs)
+    return action
+
+
 def LoByte(val):
     """Return the low byte of the value"""
     return val & 0xFF
@@ -2587,8 +2871,12 @@ def send_keys(
         turn_off_numlock=True,
         vk_packet=True,
         activate_window_before=True,
+        restore_cursor_after=False,
 ):
-    """Parse the keys and type them"""
+    """Parse the keys and type them
+
+    The mouse cursor is only moved back to its old position if restore_cursor_after is set.
+    """
     sena = (
         ctypes.c_int(handle),
         ctypes.c_int(WM_ACTIVATE),
@@ -2596,33 +2884,71 @@ def send_keys(
         ctypes.c_int(0),
     )
     cuax = None
+    if restore_cursor_after:
+        cuax = get_cursor()
     if activate_window_before:
-        SendMessageA(*sena)
         SendMessage(*sena)
         EnableWindow(handle, bEnable=True)
-        cuax = get_cursor()
         # ele = get_fg_window().hwnd
         force_activate_window(handle)
 
-    keys = parse_keys(keys, with_spaces, with_tabs, with_newlines, vk_packet=vk_packet)
-
-    for k in keys:
-        k.run()
-        time.sleep(pause)
-    if activate_window_before:
+    _send_key_templates(
+        _parse_key_templates(keys, with_spaces, with_tabs, with_newlines, vk_packet),
+        pause,
+    )
+    if restore_cursor_after:
         move(*cuax)
+    if activate_window_before:
         time.sleep(0.05)
 
         deactivate_topmost(handle)
 
 
+def _send_key_templates(templates, pause):
+    """Send parsed key templates with SendInput, sleeping pause seconds after every call"""
+    # Consecutive actions that are sent with SendInput are collected and sent
+    # together, Windows keeps the order of the events within one call.
+    # A {PAUSE n} only ends the current batch, no action is created for it.
+    batch = []
+    for cls, attrs in templates:
+        if cls is None:
+            if batch:
+                _send_key_batch(batch)
+                batch = []
+                time.sleep(pause)
+            time.sleep(attrs + pause)
+            continue
+        k = _new_action(cls, attrs)
+        if cls.run is KeyAction.run:
+            batch.append(k)
+            continue
+        if batch:
+            _send_key_batch(batch)
+            batch = []
+            time.sleep(pause)
+        k.run()
+        time.sleep(pause)
+    if batch:
+        _send_key_batch(batch)
+        time.sleep(pause)
+
+
 PBYTE256 = ctypes.c_ubyte * 256  # Represents an array of 256 unsigned bytes, used for keyboard state
+_PBYTE256_SIZE = ctypes.sizeof(PBYTE256)
+_KEYUP_LPARAM_BITS = 1 << 30 | 1 << 31  # Previous key state and transition state of a WM_KEYUP lParam
 WM_ACTIVATE = 0x0006  # Message sent when a window is activated or deactivated
 WA_ACTIVE = 1  # Indicates that the window is being activated
 WM_SYSKEYDOWN = 0x0104  # Message sent when a system key (e.g., ALT) is pressed
 WM_SYSKEYUP = 0x0105  # Message sent when a system key (e.g., ALT) is released
 WM_KEYDOWN = 0x0100  # Message sent when a non-system key is pressed
 WM_KEYUP = 0x0101  # Message sent when a non-system key is released
+WM_SYSCOMMAND = 0x0112  # Message sent when a command from the window menu is chosen
+SC_SIZE = 0xF000  # WM_SYSCOMMAND command that starts sizing the window
+HWND_BOTTOM = 1  # SetWindowPos: place the window at the bottom of the Z order
+HWND_TOPMOST = -1  # SetWindowPos: place the window above all non-topmost windows and keep it there
+HWND_NOTOPMOST = -2  # SetWindowPos: place the window above all non-topmost windows, removing the topmost flag
+SWP_NOSIZE = 1  # SetWindowPos: keep the current size
+SWP_NOMOVE = 2  # SetWindowPos: keep the current position
 
 
 # Declares at a lower level a function GetKeyboardState(state: POINTER(c_ubyte)) -> bool
@@ -2909,6 +3235,31 @@ SendMessage = ctypes.windll.user32.SendMessageW
 # Declares on low level a function SendMessageA(hWnd: HWND, Msg: UINT, wParam: WPARAM, lParam: LPARAM) -> int
 SendMessageA = ctypes.windll.user32.SendMessageA
 
+# Declares at a lower level a function SendNotifyMessageW(hWnd: HWND, Msg: UINT, wParam: WPARAM, lParam: LPARAM) -> bool
+# Example:
+#     def send_notify_message(hwnd: wintypes.HWND, msg: int, wParam: int, lParam: int) -> bool:
+#         """Sends a message to the specified window. If the window belongs to another thread,
+#         the function returns immediately without waiting for the message to be processed.
+#
+#         Args:
+#             hwnd: Handle to the window.
+#             msg: The message to send.
+#             wParam: Additional message-specific information.
+#             lParam: Additional message-specific information.
+#
+#         Returns:
+#             bool: True if successful, False otherwise.
+#         """
+#         return ctypes.windll.user32.SendNotifyMessageW(hwnd, msg, wParam, lParam)
+SendNotifyMessage = ctypes.windll.user32.SendNotifyMessageW
+SendNotifyMessage.restype = wintypes.BOOL
+SendNotifyMessage.argtypes = [
+    wintypes.HWND,
+    wintypes.UINT,
+    wintypes.WPARAM,
+    wintypes.LPARAM,
+]
+
 
 def activate_topmost(hwnd):
     """Bring a window to the top and set it as the topmost (always-on-top) window.
@@ -2916,22 +3267,17 @@ def activate_topmost(hwnd):
     Args:
         hwnd: Handle to the window to activate.
     """
-    ctypes.windll.user32.BringWindowToTop(hwnd)  # works OK
-    HWND_TOPMOST = -1
-    SWP_NOSIZE = 1
-    SWP_NOMOVE = 2
+    _BringWindowToTop(hwnd)  # works OK
     user32.SetForegroundWindow(hwnd)
     if user32.IsIconic(hwnd):
         user32.ShowWindow(hwnd, 9)
-    ctypes.windll.user32.SetWindowPos(
-        hwnd, ctypes.wintypes.HWND(HWND_TOPMOST), 0, 0, 0, 0, SWP_NOMOVE | SWP_NOSIZE
-    )
+    _SetWindowPos(hwnd, HWND_TOPMOST, 0, 0, 0, 0, SWP_NOMOVE | SWP_NOSIZE)
 
 
 def force_activate_window(hwnd):
     """Forcefully activate a window by setting it topmost, sending a resize message, and clicking.
 
-    Uses a background thread to send WM_SYSCOMMAND/SC_SIZE, then clicks to finalize activation,
+    Sends WM_SYSCOMMAND/SC_SIZE without waiting for it, then clicks to finalize activation,
     and finally removes the topmost flag.
 
     Args:
@@ -2939,16 +3285,13 @@ def force_activate_window(hwnd):
     """
     activate_topmost(hwnd)
     time.sleep(0.01)
-    WM_SYSCOMMAND = ctypes.c_int(0x0112)
-    SC_SIZE = ctypes.c_int(0xF000)
     user32.SetForegroundWindow(hwnd)
     if user32.IsIconic(hwnd):
         user32.ShowWindow(hwnd, 9)
-    t = kthread.KThread(
-        target=lambda: SendMessage(hwnd, WM_SYSCOMMAND, SC_SIZE, 0), name="baba"
-    )
-    t.start()
+    # returns at once, the sizing loop of the window runs in the window's own thread
+    SendNotifyMessage(hwnd, WM_SYSCOMMAND, SC_SIZE, 0)
     # SendMessage(hwnd, WM_SYSCOMMAND, 0xF120, 0)
+    # give the window time to enter the sizing loop, the click ends it
     time.sleep(0.1)
     left_click()
     deactivate_topmost(hwnd)
@@ -2961,7 +3304,6 @@ def deactivate_topmost(hwnd):
         hwnd: Handle to the window to deactivate from topmost.
     """
     activate_window(hwnd)
-    activate_window(hwnd)
 
 
 def activate_window(hwnd):
@@ -2973,16 +3315,9 @@ def activate_window(hwnd):
     Args:
         hwnd: Handle to the window to activate.
     """
-    HWND_TOPMOST = -1
-    SWP_NOSIZE = 1
-    SWP_NOMOVE = 2
-    ctypes.windll.user32.SetWindowPos(
-        hwnd, ctypes.wintypes.HWND(1), 0, 0, 0, 0, SWP_NOMOVE | SWP_NOSIZE
-    )
-    ctypes.windll.user32.BringWindowToTop(hwnd)
-    ctypes.windll.user32.SetWindowPos(
-        hwnd, ctypes.wintypes.HWND(-2), 0, 0, 0, 0, SWP_NOMOVE | SWP_NOSIZE
-    )
+    _SetWindowPos(hwnd, HWND_BOTTOM, 0, 0, 0, 0, SWP_NOMOVE | SWP_NOSIZE)
+    _BringWindowToTop(hwnd)
+    _SetWindowPos(hwnd, HWND_NOTOPMOST, 0, 0, 0, 0, SWP_NOMOVE | SWP_NOSIZE)
 
     user32.SetForegroundWindow(hwnd)
     if user32.IsIconic(hwnd):
@@ -3011,9 +3346,24 @@ def get_fg_window():
     Returns:
         WindowInfo: A namedtuple with details about the foreground window.
     """
-    return _get_elements_from_coords(hwnd=ctypes.windll.user32.GetForegroundWindow())[
-        "element"
-    ]
+    return _window_info(ctypes.windll.user32.GetForegroundWindow())
+
+
+def _spin_wait(seconds):
+    """Busy-wait for a short time on the high resolution performance counter.
+
+    time.sleep() is rounded up to the system timer resolution (about 15.6 ms by
+    default), so a short wait can take much longer than requested. Every poll
+    gives up the GIL with time.sleep(0), other Python threads keep running
+    while the wait spins.
+
+    Args:
+        seconds: Time to wait in seconds.
+    """
+    perf_counter, time_sleep = time.perf_counter, time.sleep
+    end = perf_counter() + seconds
+    while perf_counter() < end:
+        time_sleep(0)
 
 
 def send_keystrokes(
@@ -3038,6 +3388,9 @@ def send_keystrokes(
     `type_keys`_ method.
 
     .. _`type_keys`: pywinauto.base_wrapper.html#pywinauto.base_wrapper.BaseWrapper.type_keys
+
+    If activate_window_before is set and the window becomes the foreground window,
+    all keys are sent with SendInput at once instead of being posted one by one.
     """
 
     sena = (
@@ -3047,11 +3400,25 @@ def send_keystrokes(
         ctypes.c_int(0),
     )
     if activate_window_before:
-        SendMessageA(*sena)
         SendMessage(*sena)
         EnableWindow(handle, bEnable=True)
         force_activate_window(handle)
 
+        # The window has the keyboard focus now, so the keys can go through
+        # the input queue with SendInput. Windows keeps the order of the
+        # events, the keyboard state and the delays below are not needed.
+        if ctypes.windll.user32.GetForegroundWindow() == handle:
+            _send_key_templates(
+                _parse_key_templates(
+                    keystrokes, with_spaces, with_tabs, with_newlines, True
+                ),
+                0,
+            )
+            time.sleep(0.1)
+
+            deactivate_topmost(handle)
+            return
+
     target_thread_id = GetWindowThreadProcessId(handle, None)
     current_thread_id = GetCurrentThreadId()
     attach_success = AttachThreadInput(target_thread_id, current_thread_id, True) != 0
@@ -3062,14 +3429,18 @@ def send_keystrokes(
             stacklevel=2,
         )
 
-    keyboard_state_stack = [PBYTE256()]
-    GetKeyboardState(keyboard_state_stack[-1])
+    # Stack of keyboard states, one level per key that is held down. The
+    # buffers are reused, a new level is only allocated the first time
+    # this depth is reached.
+    keyboard_states = [PBYTE256()]
+    depth = 0
+    GetKeyboardState(keyboard_states[0])
 
     input_locale_id = GetKeyboardLayout(0)
     context_code = 0
 
     keys = parse_keys(keystrokes, with_spaces, with_tabs, with_newlines)
-    key_combos_present = any([isinstance(k, EscapedKeyAction) for k in keys])
+    key_combos_present = any(isinstance(k, EscapedKeyAction) for k in keys)
     if key_combos_present:
         warnings.warn(
             "Key combinations may or may not work depending on the target app",
@@ -3077,6 +3448,10 @@ def send_keystrokes(
             stacklevel=2,
         )
 
+    # the functions are looked up once instead of on every key
+    post_message, set_keyboard_state = PostMessage, SetKeyboardState
+    char_key_info = _char_key_info
+    spin_wait = _spin_wait
     try:
         for key in keys:
             vk, scan, flags = key.get_key_info()
@@ -3086,64 +3461,55 @@ def send_keystrokes(
             else:
                 down_msg, up_msg = WM_KEYDOWN, WM_KEYUP
 
-            repeat = 1
             shift_state = 0
             unicode_codepoint = flags & KEYEVENTF_UNICODE != 0
             if unicode_codepoint:
-                char = chr(scan)
-                vk_with_flags = VkKeyScanExW(char, input_locale_id)
-                vk = vk_with_flags & 0xFF
-                shift_state = (vk_with_flags & 0xFF00) >> 8
-                scan = MapVirtualKeyW(vk, 0)
+                vk, shift_state, scan = char_key_info(chr(scan), input_locale_id)
+
+            # repeat count 1, scan code and extended key flag, shared by both messages
+            lparam_base = 1 | scan << 16 | (flags & 1) << 24
 
             if key.down and vk > 0:
-                new_keyboard_state = copy.deepcopy(keyboard_state_stack[-1])
+                depth += 1
+                if depth == len(keyboard_states):
+                    keyboard_states.append(PBYTE256())
+                new_keyboard_state = keyboard_states[depth]
+                ctypes.memmove(
+                    new_keyboard_state, keyboard_states[depth - 1], _PBYTE256_SIZE
+                )
 
                 new_keyboard_state[vk] |= 128
                 if shift_state & 1 == 1:
                     new_keyboard_state[VK_SHIFT] |= 128
-                keyboard_state_stack.append(new_keyboard_state)
-
-                lparam = (
-                        repeat << 0
-                        | scan << 16
-                        | (flags & 1) << 24
-                        | context_code << 29
-                        | 0 << 31
-                )
 
-                SetKeyboardState(keyboard_state_stack[-1])
-                PostMessage(handle, down_msg, vk, lparam)
+                lparam = lparam_base | context_code << 29
+
+                set_keyboard_state(new_keyboard_state)
+                post_message(handle, down_msg, vk, lparam)
                 if vk == VK_MENU:
                     context_code = 1
 
                 # a delay for keyboard state to take effect
-                time.sleep(0.01)
+                spin_wait(0.01)
 
             if key.up and vk > 0:
-                keyboard_state_stack.pop()
-
-                lparam = (
-                        repeat << 0
-                        | scan << 16
-                        | (flags & 1) << 24
-                        | context_code << 29
-                        | 1 << 30
-                        | 1 << 31
-                )
+                depth = max(depth - 1, 0)
 
-                PostMessage(handle, up_msg, vk, lparam)
-                SetKeyboardState(keyboard_state_stack[-1])
+                lparam = lparam_base | context_code << 29 | _KEYUP_LPARAM_BITS
+
+                post_message(handle, up_msg, vk, lparam)
+                set_keyboard_state(keyboard_states[depth])
 
                 if vk == VK_MENU:
                     context_code = 0
 
                 # a delay for keyboard state to take effect
-                time.sleep(0.01)
+                spin_wait(0.01)
 
     except Exception as e:
-        print("fehler")
-        SetKeyboardState(keyboard_state_stack[0])
+        if DEBUG:
+            print("fehler", e)
+        SetKeyboardState(keyboard_states[0])
 
     if attach_success:
         AttachThreadInput(target_thread_id, current_thread_id, False)
@@ -3163,7 +3529,7 @@ def get_single_element_from_coord(x, y):
     Returns:
         WindowInfo: The window element found at the coordinates.
     """
-    return _get_elements_from_coords(coordx=x, coordy=y)["element"]
+    return _window_info(_WindowFromPoint(wintypes.POINT(int(x), int(y))))
 
 
 def get_single_element_from_hwnd(hwnd):
@@ -3175,7 +3541,7 @@ def get_single_element_from_hwnd(hwnd):
     Returns:
         WindowInfo: The window element for the given handle.
     """
-    return _get_elements_from_coords(hwnd=hwnd)["element"]
+    return _window_info(hwnd)
 
 
 def press_multiple_keys(keystopress, presstime=1.1, percentofregularpresstime=100):
@@ -3189,15 +3555,14 @@ def press_multiple_keys(keystopress, presstime=1.1, percentofregularpresstime=10
         presstime: Total duration in seconds for all key presses. Defaults to 1.1.
         percentofregularpresstime: Scale factor for individual key hold times. Defaults to 100.
     """
+    import kthread
     presstime *= 10000
     presstime = int(presstime)
     segtim = presstime / 200000
-    allk = [
-        [k[0], len(k[1]), k[1]]
-        for k in zip(keystopress, list(log_split(range(presstime))))
-    ]
-    print(allk)
-    timehold = sum([k[1] * 100 / percentofregularpresstime for k in allk])
+    allk = [[k, size] for k, size in zip(keystopress, _log_split_sizes(presstime))]
+    if DEBUG:
+        print(allk)
+    timehold = sum(k[1] * 100 / percentofregularpresstime for k in allk)
     restsleep = presstime - timehold
     threadlist = []
     presstime /= 10000
@@ -3216,37 +3581,65 @@ def press_multiple_keys(keystopress, presstime=1.1, percentofregularpresstime=10
     time.sleep(restsleep + segtim)
 
 
+def _run_key_schedule(events):
+    """Send scheduled key events from a heap, each at its time.perf_counter() time.
+
+    A blocked SendInput call (e.g. UIPI or a locked desktop) only drops that one
+    event. If the loop is left early, all key up events that are still queued
+    are sent at once, so no key stays held down.
+
+    Args:
+        events: A heap of (time, sequence number, INPUT) tuples, key up events have odd sequence numbers.
+    """
+    try:
+        while events:
+            when, _, key_input = heapq.heappop(events)
+            delay = when - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            _SendInputUnchecked(1, byref(key_input), _INPUT_SIZE)
+    finally:
+        for _, seq, key_input in events:
+            if seq & 1:
+                _SendInputUnchecked(1, byref(key_input), _INPUT_SIZE)
+
+
 def press_multiple_keys_own_interval(keystopress, presstime=1.1):
     """Press multiple keys with individually specified start times.
 
     Each element in keystopress is a [start_time, key_code] pair.
-    Keys are pressed in separate threads with their hold duration
-    calculated from the total presstime minus their start offset.
+    Keys are held for the total presstime minus their start offset. All key
+    events are sent by one worker thread that waits for each of them in turn.
 
     Args:
         keystopress: A list of [start_time, key_code] pairs.
         presstime: Total duration in seconds for all key presses. Defaults to 1.1.
     """
+    import kthread
     totalpresstime = presstime
-
-    sleeptimeall = np.hstack(
-        [np.diff(np.array([x[0] for x in keystopress]), axis=0), np.array([0])]
-    )
-    restssleep = totalpresstime - np.max(sleeptimeall)
-    threadlist = []
-    ini = 0
-    for k, tim in zip(keystopress, sleeptimeall):
+    if not keystopress:
+        # Nothing to schedule, only wait the total press time like before
+        time.sleep(max(totalpresstime, 0))
+        return
+
+    starts = [x[0] for x in keystopress]
+    sleeptimeall = [b - a for a, b in zip(starts, starts[1:])] + [0]
+    restssleep = totalpresstime - max(sleeptimeall)
+    t0 = time.perf_counter()
+    events = []
+    for ini, (k, tim) in enumerate(zip(keystopress, sleeptimeall)):
         ausfu = totalpresstime - k[0]
-        threadlist.append(
-            kthread.KThread(
-                target=Press, name=str(time.time()) + str(ini), args=(k[1], ausfu)
-            )
-        )
-        threadlist[-1].start()
-        time.sleep(tim)
-        ini += 1
-        print(ausfu, tim, k)
-    time.sleep(restssleep)
+        keycode = allkeys.get(k[1]) if isinstance(k[1], str) else k[1]
+        down, up = _get_press_inputs(keycode)
+        pressed = t0 + k[0] - starts[0]
+        heapq.heappush(events, (pressed, 2 * ini, down))
+        heapq.heappush(events, (pressed + max(ausfu, 0), 2 * ini + 1, up))
+        if DEBUG:
+            print(ausfu, tim, k)
+    kthread.KThread(
+        target=_run_key_schedule, name=str(time.time()), args=(events,)
+    ).start()
+    time.sleep(max(t0 + starts[-1] - starts[0] + restssleep - time.perf_counter(), 0))
 
 
 def block_user_input():
@@ -3276,82 +3669,79 @@ class MouseKey:
     providing a convenient unified API for cursor movement, clicking,
     key pressing, window management, and input blocking.
     """
+    show_all_keys = allkeys
+    # Module functions exposed as methods, set once on the class instead of
+    # being bound to every instance in __init__
+    block_user_input = staticmethod(block_user_input)
+    unblock_user_input = staticmethod(unblock_user_input)
+    get_active_window = staticmethod(get_active_window)
+    send_unicode = staticmethod(send_unicode)
+    middle_click_xy_natural = staticmethod(middle_click_xy_natural)
+    middle_click_xy_relative = staticmethod(middle_click_xy_relative)
+    middle_click_xy = staticmethod(middle_click_xy)
+    middle_click = staticmethod(middle_click)
+    right_click_xy_natural = staticmethod(right_click_xy_natural)
+    right_click_xy = staticmethod(right_click_xy)
+    right_click = staticmethod(right_click)
+    left_click_xy_natural = staticmethod(left_click_xy_natural)
+    left_click_xy = staticmethod(left_click_xy)
+    left_click = staticmethod(left_click)
+    move_to = staticmethod(move)
+    move_relative = staticmethod(move_rel)
+    move_to_natural = staticmethod(natural_mouse_movement)
+    get_screen_resolution = staticmethod(get_resolution)
+    press_key = staticmethod(Press)
+    get_cursor_position = staticmethod(get_cursor)
+    is_cursor_shown = staticmethod(is_cursor_shown)
+    send_keystrokes_to_hwnd = staticmethod(send_keystrokes)
+    activate_window = staticmethod(activate_window)
+    activate_topmost = staticmethod(activate_topmost)
+    deactivate_topmost = staticmethod(deactivate_topmost)
+    send_keys_to_hwnd = staticmethod(send_keys)
+    enable_failsafekill = staticmethod(start_failsafe)
+    get_elements_from_coords = staticmethod(get_elements_from_xy)
+    get_elements_from_hwnd = staticmethod(get_elements_from_hwnd)
+    get_single_element_from_coords = staticmethod(get_single_element_from_coord)
+    get_single_element_from_hwnd = staticmethod(get_single_element_from_hwnd)
+    left_click_xy_natural_relative = staticmethod(left_click_xy_natural_relative)
+    move_to_natural_relative = staticmethod(natural_mouse_movement_relative)
+    right_click_xy_natural_relative = staticmethod(right_click_xy_natural_relative)
+    force_activate_window = staticmethod(force_activate_window)
+    press_keys_simultaneously = staticmethod(press_multiple_keys)
+    press_keys_simultaneously_own_interval = staticmethod(press_multiple_keys_own_interval)
+    left_mouse_down = staticmethod(left_mouse_down)
+    left_mouse_up = staticmethod(left_mouse_up)
+    right_mouse_down = staticmethod(right_mouse_down)
+    right_mouse_up = staticmethod(right_mouse_up)
+    middle_mouse_down = staticmethod(middle_mouse_down)
+    middle_mouse_up = staticmethod(middle_mouse_up)
+
     def __init__(self):
-        self.block_user_input = block_user_input
-        self.unblock_user_input = unblock_user_input
-
-        self.get_active_window = get_active_window
-        self.send_unicode = send_unicode
-        self.middle_click_xy_natural = middle_click_xy_natural
-        self.middle_click_xy_relative = middle_click_xy_relative
-        self.middle_click_xy = middle_click_xy
-        self.middle_click = middle_click
-        self.right_click_xy_natural = right_click_xy_natural
-        self.right_click_xy = right_click_xy
-        self.right_click = right_click
-        self.left_click_xy_natural = left_click_xy_natural
-        self.left_click_xy = left_click_xy
-        self.left_click = left_click
-        self.move_to = move
-        self.move_relative = move_rel
-        self.move_to_natural = natural_mouse_movement
-        self.get_screen_resolution = get_resolution
-        self.press_key = Press
-        self.get_cursor_position = get_cursor
-        self.is_cursor_shown = is_cursor_shown
+        import kthread
+        from ctypes_window_info import get_window_infos
+
         self.get_all_windows = get_window_infos
-        self.send_keystrokes_to_hwnd = send_keystrokes
-        self.activate_window = activate_window
-        self.activate_topmost = activate_topmost
-        self.deactivate_topmost = deactivate_topmost
-        self.send_keys_to_hwnd = send_keys
-        self.enable_failsafekill = start_failsafe
-        self.get_elements_from_coords = get_elements_from_xy
-        self.get_elements_from_hwnd = get_elements_from_hwnd
-        self.get_single_element_from_coords = get_single_element_from_coord
-        self.get_single_element_from_hwnd = get_single_element_from_hwnd
-        self.left_click_xy_natural_relative = left_click_xy_natural_relative
-        self.move_to_natural_relative = natural_mouse_movement_relative
-        self.right_click_xy_natural_relative = right_click_xy_natural_relative
-        self.force_activate_window = force_activate_window
-        self.press_keys_simultaneously = press_multiple_keys
-        self.press_keys_simultaneously_own_interval = press_multiple_keys_own_interval
-        self.show_all_keys = allkeys
-        self.left_mouse_down = left_mouse_down
-        self.left_mouse_up = left_mouse_up
-        self.right_mouse_down = right_mouse_down
-        self.right_mouse_up = right_mouse_up
-        self.middle_mouse_down = middle_mouse_down
-        self.middle_mouse_up = middle_mouse_up
-        self.t = kthread.KThread(target=self._get_cursor, name="get_cursor")
+        self._stop_cursor = threading.Event()
+        self.t = kthread.KThread(
+            target=self._get_cursor, name="get_cursor", args=(self._stop_cursor,)
+        )
         self.show_cur = False
 
     def _kill_coord(self):
-        """Hotkey callback to stop the cursor position display and re-enable it after a brief pause."""
-        self.show_cur = False
-        time.sleep(0.05)
-        self.show_cur = True
-
-    def force_activate_window(self, hwnd):
-        """Force-activate a window and then remove its topmost flag.
-
-        Args:
-            hwnd: Handle to the window to activate.
-
-        Returns:
-            MouseKey: self, for method chaining.
-        """
-        self.force_activate_window(hwnd)
-        self.deactivate_topmost(hwnd)
-        return self
-
-    def _get_cursor(self):
-        """Internal loop that continuously prints the current cursor position until stopped."""
-        while True:
-            if self.show_cur is False:
-                break
-            time.sleep(0.001)
-            print(f"{get_cursor()}         ", end="\r")
+        """Hotkey callback to stop the cursor position display."""
+        self.stop_showing_cursor_position()
+
+    def _get_cursor(self, stop_event):
+        """Internal loop that continuously prints the current cursor position until stop_event is set."""
+        # One POINT is reused for the whole loop, the position is refreshed about once per frame
+        pos = POINT_()
+        pos_ref = ctypes.byref(pos)
+        get_cursor_pos = user32.GetCursorPos
+        write = sys.stdout.write
+        stop_wait = stop_event.wait
+        while not stop_wait(0.016):
+            get_cursor_pos(pos_ref)
+            write(f"({pos.x}, {pos.y})         \r")
 
     def start_showing_cursor_position(self, exit_keys="ctrl+l"):
         """Start printing the cursor position in real time in a background thread.
@@ -3359,6 +3749,9 @@ class MouseKey:
         Args:
             exit_keys: Hotkey combination to stop the display. Defaults to 'ctrl+l'.
         """
+        import keyboard as key_b
+        import kthread
+
         try:
             key_b.remove_hotkey(exit_keys)
         except Exception:
@@ -3366,23 +3759,20 @@ class MouseKey:
         if exit_keys not in key_b.__dict__["_hotkeys"]:
             key_b.add_hotkey(exit_keys, self._kill_coord)
         self.show_cur = True
-        if not self.t.is_alive():
-            try:
-                self.t.start()
-            except RuntimeError:
-                self.t = kthread.KThread(target=self._get_cursor, name="get_cursor")
-                self.t.start()
-        else:
-            try:
-                self.t.kill()
-            except Exception:
-                pass
-            self.t = kthread.KThread(target=self._get_cursor, name="get_cursor")
+        # every display thread has its own Event. A running thread that was
+        # not stopped simply keeps going, a stopped one finishes on its own
+        # and a new thread with a fresh Event takes over
+        if not self.t.is_alive() or self._stop_cursor.is_set():
+            self._stop_cursor = threading.Event()
+            self.t = kthread.KThread(
+                target=self._get_cursor, name="get_cursor", args=(self._stop_cursor,)
+            )
             self.t.start()
 
     def stop_showing_cursor_position(self):
         """Stop the background cursor position display."""
         self.show_cur = False
+        self._stop_cursor.set()
 
     def show_rgb_values_at_mouse_position(
             self,
@@ -3408,6 +3798,8 @@ class MouseKey:
         Returns:
             The color and position data from get_rgb_values.
         """
+        from ctypes_rgb_values import get_rgb_values
+
         return get_rgb_values(
             sleeptime=sleeptime,
             on_left_click=on_left_click,